@@ -4,11 +4,19 @@ Sistema de gerenciamento de sessões e jogadores em memória
 """
 
 # Importações necessárias para tipagem, manipulação de datas e geração de IDs únicos
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Generic, TypeVar
 from datetime import datetime
+from itertools import count, islice
+import asyncio
+import os
+import threading
+import time
 import uuid
 import random
 
+# SortedList mantém o ranking ordenado com inserção/remoção em O(log n)
+from sortedcontainers import SortedList
+
 # Importa os modelos de dados do sistema
 from models import (
     Player, DrawingSession, Prompt, PromptGenerator,
@@ -16,42 +24,193 @@ from models import (
 )
 
 
+# Tipos genéricos de chave e valor usados pelo StripedDict
+K = TypeVar("K")
+V = TypeVar("V")
+
+# Quantidade de partições (shards) dos dicionários compartilhados
+SHARD_COUNT = 32
+
+# Desbloqueios de pincéis por nível, em ordem crescente de nível
+_UNLOCKS = (
+    (3, BrushType.NEON),      # Nível 3 desbloqueia pincel neon
+    (5, BrushType.SPRAY),     # Nível 5 desbloqueia spray
+    (7, BrushType.MARKER),    # Nível 7 desbloqueia marcador
+    (10, BrushType.SPARKLE),  # Nível 10 desbloqueia brilho/sparkle
+)
+
+# Tempo (segundos) em que o ranking em cache é servido sem recálculo
+LEADERBOARD_FRESH_TTL = 30
+
+# Tempo (segundos) em que o ranking expirado ainda é servido enquanto
+# um recálculo roda em segundo plano (stale-while-revalidate)
+LEADERBOARD_STALE_TTL = 120
+
+
+class StripedDict(Generic[K, V]):
+    """
+    Dicionário particionado com um lock por partição
+
+    Cada chave é mapeada para uma partição via hash(chave) % SHARD_COUNT,
+    então operações em chaves diferentes raramente disputam o mesmo lock.
+    Leituras simples (get) não usam lock; escritas travam apenas a partição
+    da chave tocada.
+    """
+    
+    def __init__(self, shard_count: int = SHARD_COUNT):
+        # Número de partições
+        self._shard_count = shard_count
+        
+        # Uma lista de dicionários independentes, um por partição
+        self._shards: List[Dict[K, V]] = [{} for _ in range(shard_count)]
+        
+        # Um RLock por partição (reentrante para permitir chamadas aninhadas)
+        self._locks: List[threading.RLock] = [threading.RLock() for _ in range(shard_count)]
+    
+    def _index(self, key: K) -> int:
+        """Retorna o índice da partição responsável pela chave"""
+        return hash(key) % self._shard_count
+    
+    def lock_for(self, key: K) -> threading.RLock:
+        """
+        Retorna o lock da partição responsável pela chave
+        
+        Usado para operações compostas (ler-modificar-escrever) sobre uma chave
+        """
+        return self._locks[self._index(key)]
+    
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Leitura sem lock (dict.get é atômico sob o GIL)"""
+        return self._shards[self._index(key)].get(key, default)
+    
+    def __contains__(self, key: K) -> bool:
+        return key in self._shards[self._index(key)]
+    
+    def __getitem__(self, key: K) -> V:
+        return self._shards[self._index(key)][key]
+    
+    def __setitem__(self, key: K, value: V):
+        index = self._index(key)
+        with self._locks[index]:
+            self._shards[index][key] = value
+    
+    def try_remove(self, key: K) -> Optional[V]:
+        """
+        Remove a chave atomicamente (equivalente ao ConcurrentDictionary.TryRemove)
+        
+        Returns:
+            O valor removido ou None se a chave não existir
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].pop(key, None)
+
+
+class _IdPool:
+    """
+    Gerador de IDs aleatórios com buffer de os.urandom
+
+    Lê 4 KB de entropia por syscall e fatia 16 bytes por ID em memória,
+    ao invés de uma chamada a os.urandom por uuid.uuid4().
+    """
+    
+    def __init__(self, size: int = 4096):
+        # Tamanho do buffer lido a cada recarga
+        self._size = size
+        
+        # Buffer atual e posição do próximo byte livre (vazio até o primeiro uso)
+        self._buffer = b""
+        self._offset = 0
+        
+        # Protege o cursor do buffer entre threads
+        self._lock = threading.Lock()
+    
+    def next_bytes(self, count: int) -> bytes:
+        """Retorna 'count' bytes aleatórios, recarregando o buffer quando acaba"""
+        with self._lock:
+            if self._offset + count > len(self._buffer):
+                self._buffer = os.urandom(self._size)
+                self._offset = 0
+            chunk = self._buffer[self._offset:self._offset + count]
+            self._offset += count
+            return chunk
+    
+    def next_id(self) -> str:
+        """Retorna um novo ID no formato UUID versão 4"""
+        return str(uuid.UUID(bytes=self.next_bytes(16), version=4))
+
+
+# Pool compartilhado de IDs usado por jogadores, sessões e salas
+_ids = _IdPool()
+
+
 class GameManager:
     """Gerencia jogadores e sessões de jogo"""
     
     def __init__(self):
-        # Dicionário que armazena todos os jogadores ativos, indexados por ID
-        self.players: Dict[str, Player] = {}
+        # Dicionário particionado que armazena todos os jogadores ativos, indexados por ID
+        self.players: StripedDict[str, Player] = StripedDict()
+        
+        # Dicionário particionado que armazena as sessões de desenho ativas, indexadas por ID
+        self.sessions: StripedDict[str, DrawingSession] = StripedDict()
+        
+        # Dicionário particionado para as salas multiplayer: room_id -> {player_id: None}
+        # (dict como conjunto ordenado: sem duplicatas e na ordem de entrada)
+        self.multiplayer_rooms: StripedDict[str, Dict[str, None]] = StripedDict()
+        
+        # Ranking mantido ordenado incrementalmente
+        # Cada entrada é (-nível, -acertos, ordem de criação, player_id)
+        self._board: SortedList = SortedList()
+        
+        # Entrada atual de cada jogador no ranking: player_id -> tupla
+        # (necessária para remover a entrada antiga depois que o jogador muda)
+        self._board_key: Dict[str, tuple] = {}
+        
+        # Contador da ordem de criação, usado como desempate (mesma ordem do sort estável)
+        self._board_seq = count()
         
-        # Dicionário que armazena todas as sessões de desenho ativas, indexadas por ID
-        self.sessions: Dict[str, DrawingSession] = {}
+        # Lock do ranking (estrutura compartilhada por todas as partições)
+        self._board_lock = threading.Lock()
         
-        # Dicionário para gerenciar salas multiplayer: room_id -> lista de player_ids
-        self.multiplayer_rooms: Dict[str, List[str]] = {}
+        # Cache stale-while-revalidate do ranking, indexado pelo limite pedido
+        # limit -> {"data", "fresh_until", "stale_until", "refreshing"}
+        self._lb_cache: Dict[int, Dict] = {}
         
-    def create_player(self, name: str) -> Player:
+        # Referências às tarefas de recálculo em andamento (evita coleta pelo GC)
+        self._lb_tasks: set = set()
+        
+    def create_player(self, name: str, player_id: Optional[str] = None, now: Optional[datetime] = None) -> Player:
         """
         Cria um novo jogador no sistema
         
         Args:
             name: Nome do jogador
+            player_id: ID a ser usado (opcional, gera um UUID se omitido)
+            now: Horário de criação já lido pelo chamador (opcional, lê o relógio se omitido)
             
         Returns:
             Player: Instância do jogador criado
         """
-        # Gera um ID único para o jogador usando UUID
-        player_id = str(uuid.uuid4())
+        # Gera um ID único para o jogador (UUID) se nenhum foi fornecido
+        if player_id is None:
+            player_id = _ids.next_id()
         
         # Cria uma nova instância de Player com os dados iniciais
         player = Player(
             id=player_id,
             name=name,
-            last_played=datetime.now()  # Registra o momento da criação
+            last_played=now or datetime.now()  # Registra o momento da criação
         )
         
         # Armazena o jogador no dicionário de jogadores
         self.players[player_id] = player
         
+        # Insere o jogador no ranking
+        self._update_rank(player)
+        
+        # Um jogador novo dentro do maior top-K em cache (ex.: ranking ainda curto) muda o ranking servido
+        self._invalidate_leaderboard(player)
+        
         return player
     
     def get_player(self, player_id: str) -> Optional[Player]:
@@ -83,14 +242,20 @@ class GameManager:
         Returns:
             DrawingSession: Nova sessão de desenho criada
         """
-        # Busca o jogador pelo ID
+        # Lê o relógio uma única vez para todos os horários desta requisição
+        now = datetime.now()
+        
+        # Busca o jogador pelo ID (leitura sem lock no caminho comum)
         player = self.get_player(player_id)
         
         # Se o jogador não existir, cria um automaticamente
         if not player:
-            player = self.create_player(f"Player_{player_id}")
-            player.id = player_id  # Usa o ID fornecido ao invés de gerar um novo
-            self.players[player_id] = player
+            # Trava a partição do ID para que requisições simultâneas não criem dois jogadores
+            with self.players.lock_for(player_id):
+                player = self.get_player(player_id)
+                if not player:
+                    # Usa o ID fornecido ao invés de gerar um novo
+                    player = self.create_player(f"Player_{player_id}", player_id=player_id, now=now)
         
         # Ajusta a dificuldade baseado no nível do jogador
         # Jogadores iniciantes (nível < 3) sempre começam no fácil
@@ -100,21 +265,22 @@ class GameManager:
         elif player.level < 7:
             difficulty = Difficulty.MEDIUM
         # Jogadores avançados (nível 7+) alternam entre médio e difícil
+        # (um único bit aleatório, sem montar uma lista a cada sessão)
         else:
-            difficulty = random.choice([Difficulty.MEDIUM, Difficulty.HARD])
+            difficulty = Difficulty.HARD if random.getrandbits(1) else Difficulty.MEDIUM
         
         # Gera um novo prompt (desafio de desenho) baseado na dificuldade
         prompt = PromptGenerator.generate(difficulty, surprise=surprise_mode)
         
         # Gera um ID único para a sessão
-        session_id = str(uuid.uuid4())
+        session_id = _ids.next_id()
         
         # Cria uma nova sessão de desenho
         session = DrawingSession(
             session_id=session_id,
             player=player,
             prompt=prompt,
-            started_at=datetime.now()  # Registra o horário de início
+            started_at=now  # Registra o horário de início
         )
         
         # Armazena a sessão no dicionário de sessões ativas
@@ -125,7 +291,7 @@ class GameManager:
     def complete_session(
         self,
         session_id: str,
-        drawing_data: str,
+        drawing_hash: str,
         ai_result: Dict,
         time_spent: float
     ) -> Dict:
@@ -134,7 +300,7 @@ class GameManager:
         
         Args:
             session_id: ID da sessão a ser completada
-            drawing_data: Dados do desenho em formato string
+            drawing_hash: Hash do desenho (identifica a imagem sem guardá-la)
             ai_result: Resultado da análise da IA (palpites, acurácia, etc)
             time_spent: Tempo gasto desenhando em segundos
             
@@ -149,16 +315,73 @@ class GameManager:
         Raises:
             ValueError: Se a sessão não for encontrada
         """
-        # Busca a sessão pelo ID
-        session = self.sessions.get(session_id)
+        return self.score_session(self.claim_session(session_id), drawing_hash, ai_result, time_spent)
+    
+    def claim_session(self, session_id: str) -> DrawingSession:
+        """
+        Retira a sessão das ativas para pontuá-la depois com score_session
+        
+        Usado quando a análise roda em segundo plano: a partir daqui nenhuma
+        outra requisição consegue finalizar a mesma sessão.
+        
+        Args:
+            session_id: ID da sessão
+            
+        Returns:
+            DrawingSession: A sessão retirada
+            
+        Raises:
+            ValueError: Se a sessão não for encontrada
+        """
+        # Remove a sessão atomicamente: uma mesma sessão não pode ser pontuada duas vezes
+        session = self.sessions.try_remove(session_id)
         if not session:
             raise ValueError("Sessão não encontrada")
+        return session
+    
+    def score_session(
+        self,
+        session: DrawingSession,
+        drawing_hash: str,
+        ai_result: Dict,
+        time_spent: float
+    ) -> Dict:
+        """
+        Calcula as recompensas de uma sessão já retirada por claim_session
+        
+        Args e retorno iguais aos de complete_session, recebendo a sessão em vez do ID.
+        """
+        # Referência ao jogador da sessão
+        player = session.player
         
+        # Trava apenas a partição do jogador enquanto suas estatísticas são atualizadas
+        with self.players.lock_for(player.id):
+            return self._apply_session_result(session, ai_result, drawing_hash, time_spent)
+    
+    def _apply_session_result(
+        self,
+        session: DrawingSession,
+        ai_result: Dict,
+        drawing_hash: str,
+        time_spent: float
+    ) -> Dict:
+        """
+        Aplica o resultado da IA à sessão e ao jogador (chamado com o lock do jogador)
+        
+        Args:
+            session: Sessão sendo completada
+            ai_result: Resultado da análise da IA
+            drawing_hash: Hash do desenho (identifica a imagem sem guardá-la)
+            time_spent: Tempo gasto desenhando em segundos
+            
+        Returns:
+            Dict com o mesmo formato de complete_session
+        """
         # Referência ao jogador da sessão
         player = session.player
         
         # Atualiza os dados da sessão com o resultado
-        session.drawing_data = drawing_data  # Salva o desenho
+        session.drawing_hash = drawing_hash  # Guarda só o hash do desenho
         session.ai_guesses = ai_result.get("guesses", [])  # Palpites da IA
         session.correct = ai_result.get("correct", False)  # Se acertou
         session.time_spent = time_spent  # Tempo gasto
@@ -186,21 +409,33 @@ class GameManager:
         else:
             player.streak = 0  # Reseta a sequência de acertos
         
+        # Atualiza a taxa de acertos uma única vez aqui, em vez de recalcular em cada leitura
+        player.accuracy = round(player.correct_guesses * 100 / player.total_drawings, 1)
+        
         # Adiciona XP (experiência) ao jogador e verifica se subiu de nível
+        # (antes das conquistas, pois "level_10" depende do nível alcançado)
         level_up = player.add_xp(session.score)
         
-        # Verifica e desbloqueia novos pincéis baseado no nível
+        # Verifica se o jogador desbloqueou novas conquistas (achievements)
+        # Busca os dados de cada conquista uma única vez: (id, dados)
+        new_achievements = [
+            (aid, AchievementSystem.ACHIEVEMENTS[aid])
+            for aid in AchievementSystem.check_achievements(player, session)
+        ]
+        
+        # Adiciona o XP bônus de todas as conquistas de uma vez
+        # (um nível ganho só com esse bônus também conta como level up)
+        if new_achievements:
+            level_up = player.add_xp(sum(achievement["xp"] for _, achievement in new_achievements)) or level_up
+        
+        # Verifica e desbloqueia novos pincéis com o nível final, já incluindo o XP das conquistas
         self._unlock_brushes(player)
         
-        # Verifica se o jogador desbloqueou novas conquistas (achievements)
-        new_achievements = AchievementSystem.check_achievements(
-            player, session
-        )
+        # Reposiciona o jogador no ranking (só muda se nível ou acertos mudaram)
+        self._update_rank(player)
         
-        # Adiciona XP bônus pelas conquistas desbloqueadas
-        for achievement_id in new_achievements:
-            achievement = AchievementSystem.ACHIEVEMENTS[achievement_id]
-            player.add_xp(achievement["xp"])
+        # Descarta o ranking em cache apenas se o jogador aparece nele
+        self._invalidate_leaderboard(player)
         
         # Retorna um dicionário completo com todos os resultados
         return {
@@ -215,36 +450,77 @@ class GameManager:
                 }
             },
             "achievements": [  # Lista de conquistas desbloqueadas
-                {
-                    "id": aid,
-                    **AchievementSystem.ACHIEVEMENTS[aid]
-                }
-                for aid in new_achievements
+                {"id": aid, **achievement}
+                for aid, achievement in new_achievements
             ],
             "level_up": level_up,  # Boolean indicando se subiu de nível
             "new_level": player.level if level_up else None  # Novo nível ou None
         }
     
+    def _update_rank(self, player: Player):
+        """
+        Atualiza a posição do jogador no ranking ordenado
+        
+        Só remove/reinsere quando a chave de ordenação (nível, acertos) mudou,
+        em O(log n) ao invés de reordenar todos os jogadores.
+        
+        Args:
+            player: Jogador cuja posição deve ser atualizada
+        """
+        with self._board_lock:
+            old_key = self._board_key.get(player.id)
+            
+            # Mantém a ordem de criação original como desempate
+            seq = old_key[2] if old_key else next(self._board_seq)
+            new_key = (-player.level, -player.correct_guesses, seq, player.id)
+            
+            # Nada a fazer se a chave de ordenação não mudou
+            if new_key == old_key:
+                return
+            
+            # Remove a entrada antiga (se houver) e insere a nova
+            if old_key is not None:
+                self._board.remove(old_key)
+            self._board.add(new_key)
+            self._board_key[player.id] = new_key
+    
+    def _invalidate_leaderboard(self, player: Player):
+        """
+        Descarta o ranking em cache se o jogador está entre os exibidos
+        
+        Jogadores fora do maior top-K em cache não alteram nenhum ranking servido.
+        
+        Args:
+            player: Jogador recém-criado ou que acabou de ter suas estatísticas alteradas
+        """
+        if not self._lb_cache:
+            return
+        
+        with self._board_lock:
+            position = self._board.index(self._board_key[player.id])
+        
+        # Nível e acertos só crescem: se o jogador está fora do top-K agora,
+        # também estava antes, e o ranking em cache continua válido
+        if position < max(self._lb_cache):
+            self._lb_cache.clear()
+    
     def _unlock_brushes(self, player: Player):
         """
         Desbloqueia pincéis especiais baseado no nível do jogador
         
+        Usa o cursor salvo no jogador para verificar apenas os desbloqueios
+        ainda não concedidos (o nível nunca diminui).
+        
         Args:
             player: Jogador para verificar desbloqueios
         """
-        # Dicionário mapeando nível -> tipo de pincel desbloqueado
-        unlocks = {
-            3: BrushType.NEON,      # Nível 3 desbloqueia pincel neon
-            5: BrushType.SPRAY,     # Nível 5 desbloqueia spray
-            7: BrushType.MARKER,    # Nível 7 desbloqueia marcador
-            10: BrushType.SPARKLE   # Nível 10 desbloqueia brilho/sparkle
-        }
-        
-        # Itera pelos desbloqueios e adiciona os pincéis apropriados
-        for level, brush in unlocks.items():
-            # Se o jogador atingiu o nível necessário, desbloqueia o pincel
-            if player.level >= level:
-                player.unlock_brush(brush)
+        # Avança o cursor enquanto o jogador tiver nível para o próximo desbloqueio
+        while player.brush_unlock_cursor < len(_UNLOCKS):
+            level, brush = _UNLOCKS[player.brush_unlock_cursor]
+            if player.level < level:
+                break
+            player.unlock_brush(brush)
+            player.brush_unlock_cursor += 1
     
     def create_multiplayer_room(self, player_id: str) -> str:
         """
@@ -256,13 +532,19 @@ class GameManager:
         Returns:
             str: ID da sala criada (8 caracteres)
         """
-        # Gera um ID único de 8 caracteres para a sala
-        room_id = str(uuid.uuid4())[:8]
-        
-        # Cria a sala com o criador como primeiro jogador
-        self.multiplayer_rooms[room_id] = [player_id]
-        
-        return room_id
+        while True:
+            # Gera um ID de 8 caracteres hexadecimais (4 bytes aleatórios, sem formatar um UUID inteiro)
+            room_id = _ids.next_bytes(4).hex()
+            
+            # Trava a partição da sala para que a verificação e a criação sejam atômicas
+            with self.multiplayer_rooms.lock_for(room_id):
+                # Com só 32 bits, colisões são possíveis: sorteia outro ID se já existir
+                if room_id in self.multiplayer_rooms:
+                    continue
+                
+                # Cria a sala com o criador como primeiro jogador
+                self.multiplayer_rooms[room_id] = {player_id: None}
+                return room_id
     
     def join_multiplayer_room(self, room_id: str, player_id: str) -> bool:
         """
@@ -275,12 +557,15 @@ class GameManager:
         Returns:
             bool: True se conseguiu entrar, False se a sala não existe
         """
-        # Verifica se a sala existe
-        if room_id in self.multiplayer_rooms:
-            # Adiciona o jogador apenas se ele ainda não estiver na sala
-            if player_id not in self.multiplayer_rooms[room_id]:
-                self.multiplayer_rooms[room_id].append(player_id)
-            return True
+        # Trava a partição da sala para que a verificação e a inserção sejam atômicas
+        with self.multiplayer_rooms.lock_for(room_id):
+            room = self.multiplayer_rooms.get(room_id)
+            
+            # Verifica se a sala existe
+            if room is not None:
+                # Chave repetida não duplica o jogador, sem varrer a sala a cada entrada
+                room[player_id] = None
+                return True
         
         # Retorna False se a sala não existir
         return False
@@ -295,11 +580,13 @@ class GameManager:
         Returns:
             List[Player]: Lista de objetos Player na sala
         """
-        # Busca os IDs dos jogadores na sala (lista vazia se sala não existe)
-        player_ids = self.multiplayer_rooms.get(room_id, [])
+        # Busca os IDs dos jogadores na sala (vazio se sala não existe)
+        # Copia as chaves (ordem de entrada) para não iterar sobre a sala enquanto outro jogador entra
+        player_ids = list(self.multiplayer_rooms.get(room_id, {}))
         
-        # Converte IDs em objetos Player, filtrando IDs inválidos
-        return [self.get_player(pid) for pid in player_ids if self.get_player(pid)]
+        # Converte IDs em objetos Player, filtrando IDs inválidos (uma busca por ID)
+        players = self.players
+        return [player for pid in player_ids if (player := players.get(pid)) is not None]
     
     def get_leaderboard(self, limit: int = 10) -> List[Dict]:
         """
@@ -311,12 +598,13 @@ class GameManager:
         Returns:
             List[Dict]: Lista ordenada dos melhores jogadores com suas estatísticas
         """
-        # Ordena todos os jogadores por nível e acertos (decrescente)
-        sorted_players = sorted(
-            self.players.values(),
-            key=lambda p: (p.level, p.correct_guesses),  # Prioriza nível, depois acertos
-            reverse=True  # Ordem decrescente (maiores primeiro)
-        )
+        # Lê apenas as primeiras 'limit' entradas do ranking já ordenado
+        # (nível e acertos decrescentes, desempate pela ordem de criação)
+        with self._board_lock:
+            top_ids = [entry[3] for entry in islice(self._board, limit)]
+        
+        # Converte IDs em objetos Player
+        top_players = [self.players[pid] for pid in top_ids]
         
         # Retorna uma lista de dicionários com as informações de cada jogador
         return [
@@ -326,10 +614,68 @@ class GameManager:
                 "level": p.level,  # Nível atual
                 "xp": p.xp,  # Experiência total
                 "total_drawings": p.total_drawings,  # Total de desenhos feitos
-                # Calcula a precisão em porcentagem (evita divisão por zero)
-                "accuracy": round((p.correct_guesses / p.total_drawings * 100) if p.total_drawings > 0 else 0, 1),
+                "accuracy": p.accuracy,  # Precisão em porcentagem (mantida no jogador a cada desenho)
                 "streak": p.streak  # Sequência atual de acertos
             }
-            # Itera apenas pelos primeiros 'limit' jogadores
-            for i, p in enumerate(sorted_players[:limit])
+            for i, p in enumerate(top_players)
         ]
+
+    async def get_cached_leaderboard(self, limit: int = 10) -> List[Dict]:
+        """
+        Retorna o ranking usando cache stale-while-revalidate
+        
+        - Dentro de LEADERBOARD_FRESH_TTL: devolve o cache
+        - Dentro de LEADERBOARD_STALE_TTL: devolve o cache e agenda um único
+          recálculo em segundo plano
+        - Depois disso (ou sem cache): recalcula imediatamente
+        
+        Args:
+            limit: Número máximo de jogadores a retornar (padrão: 10)
+            
+        Returns:
+            List[Dict]: Mesmo formato de get_leaderboard
+        """
+        now = time.monotonic()
+        entry = self._lb_cache.get(limit)
+        
+        if entry is not None:
+            # Cache fresco: serve direto da memória
+            if now < entry["fresh_until"]:
+                return entry["data"]
+            
+            # Cache expirado mas aceitável: serve e recalcula em segundo plano
+            if now < entry["stale_until"]:
+                # Apenas uma tarefa de recálculo por limite
+                if not entry["refreshing"]:
+                    entry["refreshing"] = True
+                    task = asyncio.create_task(self._refresh_leaderboard(limit))
+                    self._lb_tasks.add(task)
+                    task.add_done_callback(self._lb_tasks.discard)
+                return entry["data"]
+        
+        # Sem cache utilizável: calcula na hora
+        return self._store_leaderboard(limit)
+    
+    async def _refresh_leaderboard(self, limit: int):
+        """Recalcula o ranking em segundo plano (tarefa agendada pelo cache)"""
+        self._store_leaderboard(limit)
+    
+    def _store_leaderboard(self, limit: int) -> List[Dict]:
+        """
+        Calcula o ranking e armazena no cache com novos prazos de validade
+        
+        Args:
+            limit: Número máximo de jogadores
+            
+        Returns:
+            List[Dict]: Ranking recém-calculado
+        """
+        data = self.get_leaderboard(limit)
+        now = time.monotonic()
+        self._lb_cache[limit] = {
+            "data": data,
+            "fresh_until": now + LEADERBOARD_FRESH_TTL,
+            "stale_until": now + LEADERBOARD_STALE_TTL,
+            "refreshing": False
+        }
+        return data
@@ -1,337 +1,1023 @@
-"""
-Script de teste para verificar conexão com Google Gemini API
-"""
-
-# Importações necessárias para o funcionamento do serviço
-import os  # Para acessar variáveis de ambiente
-import sys  # Para operações do sistema
-import requests  # Para fazer requisições HTTP à API do Gemini
-from dotenv import load_dotenv  # Para carregar variáveis de ambiente do arquivo .env
-import base64  # Para trabalhar com imagens codificadas em base64
-import json  # Para processar respostas JSON da API
-from typing import List, Dict, Any  # Para type hints
-
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-
-
-class GeminiService:
-    """Integração com Google Gemini (Generative Language API).
-
-    - Usa `GEMINI_API_KEY` a partir do ambiente.
-    - Faz uma requisição simples ao endpoint `:generateContent` e tenta
-      extrair texto com palpites e confidências.
-    - Se não houver `GEMINI_API_KEY`, retorna um stub local.
-    """
-
-    # Modelo padrão a ser usado, obtido da variável de ambiente ou usando "gemini-2.0" como padrão
-    DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0")
-
-    def __init__(self):
-        """Inicializa o serviço do Gemini."""
-        # Obtém a chave da API do ambiente
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        # Define o modelo a ser usado
-        self.model = self.DEFAULT_MODEL
-
-    def _extract_text_from_response(self, result: Dict[str, Any]) -> str:
-        """Extrai o texto da resposta da API do Gemini.
-        
-        A API pode retornar diferentes formatos de resposta, então tentamos
-        múltiplas estratégias para extrair o texto.
-        
-        Args:
-            result: Dicionário com a resposta da API
-            
-        Returns:
-            String com o texto extraído ou vazio se não conseguir extrair
-        """
-        # Suportar formas diferentes de resposta
-        # Formato antigo: candidates -> content -> parts -> text
-        try:
-            candidates = result.get("candidates")
-            if candidates and isinstance(candidates, list):
-                # Navega pela estrutura aninhada para encontrar o texto
-                return candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        except Exception:
-            # Se falhar, tenta o próximo formato
-            pass
-
-        # Novo formato possível: outputs -> content -> [text]
-        try:
-            outputs = result.get("outputs")
-            if outputs and isinstance(outputs, list):
-                # Procurar o primeiro campo textual nos outputs
-                for out in outputs:
-                    if isinstance(out, dict):
-                        # Tenta encontrar o campo "content"
-                        if "content" in out:
-                            content = out["content"]
-                            if isinstance(content, list) and content:
-                                return content[0].get("text", "") if isinstance(content[0], dict) else str(content[0])
-                        # Tenta encontrar o campo "text" diretamente
-                        if "text" in out:
-                            return out.get("text", "")
-        except Exception:
-            # Se falhar, tenta o próximo método
-            pass
-
-        # Fallback: tentar serializar tudo como JSON
-        try:
-            return json.dumps(result)
-        except Exception:
-            # Se tudo falhar, retorna string vazia
-            return ""
-
-    def analyze_drawing(self, img_data: str, prompt_text: str) -> dict:
-        """Analisa uma imagem codificada em base64 junto ao prompt.
-
-        Retorna dicionário com chaves esperadas pelo `game_manager`/`main.py`:
-        - `guesses`: lista de strings com os palpites da IA
-        - `confidence`: inteiro 0-100 indicando confiança da IA
-        - `feedback`: texto com comentário sobre o desenho
-        - `reaction`: texto curto com reação da IA
-        - `correct`: boolean indicando se acertou
-        
-        Args:
-            img_data: String com a imagem codificada em base64
-            prompt_text: String com o prompt/palavra alvo do desenho
-            
-        Returns:
-            Dicionário com os resultados da análise
-        """
-        # Se não houver API key configurada, retorna um resultado stub (falso)
-        if not self.api_key:
-            return {
-                "guesses": [],
-                "confidence": 50,
-                "feedback": "No API key provided; returning stub result.",
-                "reaction": "no-api-key",
-                "correct": False,
-            }
-
-        # Modo de API: 'rest' usa o endpoint :generate, 'compat' tenta generateContent/generateText
-        api_mode = os.getenv("GEMINI_API_MODE", "compat")
-
-        # Lista de modelos para tentar em ordem de preferência
-        models_to_try = [self.model, f"{self.model}-mini", os.getenv("GEMINI_MODEL_ALT", "text-bison-001")]
-        # Ações/endpoints diferentes para tentar
-        actions = ["generateContent", "generateText"]
-
-        # Monta o prompt para a IA analisar o desenho
-        user_prompt = (
-            "Você recebe um desenho codificado em base64 e um prompt alvo. "
-            "Retorne um JSON com a chave 'guesses' contendo até 5 objetos {label, confidence}, "
-            "a chave 'feedback' com comentário breve e 'reaction' com uma palavra curta.\n"
-            f"Prompt alvo: {prompt_text}\n"
-            "Desenho(base64): "
-            f"{img_data[:200]}"  # Apenas os primeiros 200 caracteres da imagem
-        )
-
-        # Diferentes formatos de payload para tentar com a API
-        # Cada formato pode funcionar com diferentes versões/endpoints da API
-        payload_candidates = [
-            # Formato padrão com contents e generationConfig
-            {"contents": [{"parts": [{"text": user_prompt}]}], "generationConfig": {"temperature": 0.2, "maxOutputTokens": 300}},
-            # Formato simples com apenas text
-            {"text": user_prompt},
-            # Formato com input
-            {"input": user_prompt},
-            # Formato com prompt
-            {"prompt": user_prompt},
-            # Formato com instances (para alguns endpoints)
-            {"instances": [{"text": user_prompt}]},
-        ]
-
-        # Payloads específicos para o endpoint REST/generate
-        payload_candidates_rest = [
-            {"instances": [{"input": user_prompt}]},
-            {"instances": [{"content": [{"type": "text", "text": user_prompt}]}]},
-            {"input": user_prompt},
-            {"prompt": user_prompt},
-        ]
-
-        # Variáveis para controle de tentativas
-        last_exception = None  # Armazena o último erro ocorrido
-        result = None  # Armazenará o resultado bem-sucedido
-        used_model = None  # Qual modelo funcionou
-        used_action = None  # Qual ação/endpoint funcionou
-
-        # Define quais payloads usar baseado no modo de API
-        if api_mode == "rest":
-            actions = ["generate", "generateContent", "generateText"]
-            payloads_to_try = payload_candidates_rest
-        else:
-            payloads_to_try = payload_candidates
-
-        # Loop triplo para tentar todas as combinações de modelo/ação/base URL/payload
-        for model_try in models_to_try:
-            if not model_try:
-                continue
-            # Tenta diferentes ações (endpoints)
-            for action in actions:
-                # Tenta diferentes versões da API (v1beta e v1)
-                for base in ("https://generativelanguage.googleapis.com/v1beta", "https://generativelanguage.googleapis.com/v1"):
-                    # Monta a URL completa com modelo, ação e chave de API
-                    url = f"{base}/models/{model_try}:{action}?key={self.api_key}"
-                    # Tenta diferentes formatos de payload
-                    for payload in payloads_to_try:
-                        try:
-                            # Faz a requisição POST para a API
-                            resp = requests.post(url, json=payload, timeout=15)
-                            if resp.status_code == 200:
-                                # Sucesso! Armazena o resultado
-                                result = resp.json()
-                                used_model = model_try
-                                used_action = action
-                                break
-                            else:
-                                # Falhou, armazena o erro e tenta próximo
-                                last_exception = requests.exceptions.HTTPError(f"{resp.status_code} {resp.text}")
-                                continue
-                        except requests.exceptions.RequestException as e:
-                            # Erro de rede/timeout, armazena e tenta próximo
-                            last_exception = e
-                            continue
-                    # Se encontrou resultado, para de tentar
-                    if result is not None:
-                        break
-                if result is not None:
-                    break
-            if result is not None:
-                break
-
-        # Se nenhuma tentativa funcionou, tenta descobrir modelos disponíveis
-        if result is None:
-            try:
-                # Busca a lista de modelos disponíveis na conta
-                models_url = f"https://generativelanguage.googleapis.com/v1/models?key={self.api_key}"
-                ml = requests.get(models_url, timeout=10)
-                if ml.status_code == 200:
-                    available = ml.json().get("models", [])
-                    fallback_models = []
-                    # Extrai os nomes dos modelos disponíveis
-                    for m in available:
-                        name = m.get("name")
-                        if not name:
-                            continue
-                        # Remove o prefixo 'models/' se presente
-                        fallback_models.append(name.replace("models/", ""))
-
-                    # Tenta novamente com os modelos descobertos
-                    for model_try in fallback_models:
-                        if not model_try:
-                            continue
-                        for action in actions:
-                            for base in ("https://generativelanguage.googleapis.com/v1beta", "https://generativelanguage.googleapis.com/v1"):
-                                url = f"{base}/models/{model_try}:{action}?key={self.api_key}"
-                                for payload in payloads_to_try:
-                                    try:
-                                        resp = requests.post(url, json=payload, timeout=15)
-                                        if resp.status_code == 200:
-                                            result = resp.json()
-                                            used_model = model_try
-                                            used_action = action
-                                            break
-                                        else:
-                                            last_exception = requests.exceptions.HTTPError(f"{resp.status_code} {resp.text}")
-                                            continue
-                                    except requests.exceptions.RequestException as e:
-                                        last_exception = e
-                                        continue
-                                if result is not None:
-                                    break
-                            if result is not None:
-                                break
-                        if result is not None:
-                            break
-            except Exception:
-                # Se falhar na listagem, ignora e cai para retorno de erro abaixo
-                pass
-
-        # Se todas as tentativas falharam, retorna erro
-        if result is None:
-            return {
-                "guesses": [],
-                "confidence": 0,
-                "feedback": f"Request error: {last_exception}",
-                "reaction": "error",
-                "correct": False,
-            }
-
-        # Opcional: logar modelo/ação usados (não print aqui para não poluir)
-
-        # Extrai o texto da resposta usando o método auxiliar
-        text = self._extract_text_from_response(result).strip()
-        
-        # Limpar blocos de markdown (```...```), se existirem
-        import re
-        # Remove blocos markdown com linguagem especificada
-        text = re.sub(r"```[a-zA-Z]*\\n([\\s\\S]*?)```", r"\1", text)
-        # Remove blocos markdown simples
-        text = re.sub(r"```([\\s\\S]*?)```", r"\1", text)
-        # Remove marcadores de código que sobraram
-        text = text.replace('```', '')
-
-        # Tenta fazer parse do texto como JSON
-        parsed = None
-        try:
-            parsed = json.loads(text)
-        except Exception:
-            # Se falhar, tenta encontrar um JSON dentro do texto
-            start = text.find("{")
-            end = text.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                snippet = text[start:end+1]
-                try:
-                    parsed = json.loads(snippet)
-                except Exception:
-                    parsed = None
-
-        # Valores padrão para o retorno
-        guesses: List[str] = []
-        confidence = 50
-        feedback = ""
-        reaction = "thinking"
-        correct = False
-
-        # Se conseguiu fazer parse do JSON, extrai os dados
-        if isinstance(parsed, dict):
-            # Obtém a lista de palpites (pode estar em 'guesses' ou 'predictions')
-            g = parsed.get("guesses") or parsed.get("predictions")
-            if isinstance(g, list):
-                # Extrai até 5 palpites, convertendo para string
-                guesses = [str(item.get("label") if isinstance(item, dict) else str(item)) for item in g[:5]]
-                # Tenta pegar o valor de confidence do primeiro palpite
-                first = g[0] if g else None
-                if isinstance(first, dict) and first.get("confidence") is not None:
-                    try:
-                        confidence = int(first.get("confidence"))
-                    except Exception:
-                        pass
-            # Extrai feedback e reaction
-            feedback = parsed.get("feedback", "") or parsed.get("comment", "")
-            reaction = parsed.get("reaction", reaction)
-            # Avalia se acertou comparando o primeiro palpite com o prompt
-            if guesses:
-                correct = prompt_text.lower() in guesses[0].lower() or guesses[0].lower() in prompt_text.lower()
-        else:
-            # Fallback: se não conseguiu fazer parse, tenta extrair algo do texto
-            lines = [l.strip() for l in text.splitlines() if l.strip()]
-            if lines:
-                # Usa a primeira linha como palpite
-                guesses = [lines[0]]
-                # Mensagem amigável de fallback
-                feedback = "A IA ficou sem palavras com sua criatividade!"
-            else:
-                # Se não há nada, usa mensagem padrão
-                feedback = "A IA ficou sem palavras com sua criatividade!"
-
-        # Retorna o resultado estruturado
-        return {
-            "guesses": guesses,
-            "confidence": confidence,
-            "feedback": feedback,
-            "reaction": reaction,
-            "correct": correct,
-        }
+"""
+Script de teste para verificar conexão com Google Gemini API
+"""
+
+# Importações necessárias para o funcionamento do serviço
+import asyncio  # Para agrupar desenhos simultâneos em lotes
+import os  # Para acessar variáveis de ambiente
+import random  # Para o jitter do backoff entre tentativas
+import sys  # Para operações do sistema
+import httpx  # Cliente HTTP assíncrono (HTTP/2 + pool de conexões) para a API do Gemini
+import orjson  # Parse e serialização rápidos do JSON da API
+from dotenv import load_dotenv  # Para carregar variáveis de ambiente do arquivo .env
+import hashlib  # Para o hash BLAKE2b usado como chave do cache de análises
+import re  # Para remover cercas de markdown da resposta
+import time  # Para a validade (TTL) das entradas do cache
+import unicodedata  # Para comparar palpites ignorando acentos
+from collections import OrderedDict  # Para o cache LRU de análises
+from contextlib import asynccontextmanager  # Para a vaga no limite de concorrência
+from itertools import islice, product  # Para fatiar palpites sem cópia e combinar modelos e versões da API
+from pathlib import Path  # Para o arquivo com o endpoint que funcionou
+from typing import List, Dict, Any, AsyncIterator, ClassVar, Optional, Set, Tuple  # Para type hints
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Número máximo de desenhos enviados em uma única requisição em lote
+BATCH_MAX_ITEMS = 16
+
+# Janela (segundos) em que desenhos simultâneos são agrupados em um lote
+BATCH_WINDOW = 0.05
+
+# Cercas de markdown (```json ... ```) no início/fim da resposta da IA, compiladas uma única vez
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.S | re.I)
+
+# Trecho JSON (objeto ou array) no meio de texto livre: do primeiro delimitador ao último
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.S)
+
+# Versões da API a tentar, em ordem de preferência
+_API_BASES = ("https://generativelanguage.googleapis.com/v1beta", "https://generativelanguage.googleapis.com/v1")
+
+# Prompt enviado junto com a imagem; só o alvo muda entre chamadas
+_PROMPT_TEMPLATE = (
+    "Você recebe um desenho e um prompt alvo. "
+    "Retorne um JSON com a chave 'guesses' contendo até 5 objetos {{label, confidence}}, "
+    "a chave 'feedback' com comentário breve e 'reaction' com uma palavra curta.\n"
+    "Prompt alvo: {target}"
+)
+
+# Configuração de geração compartilhada por todas as chamadas (não modificar)
+_GENERATION_CONFIG = {"temperature": 0.2, "maxOutputTokens": 300}
+
+# Chave do cache de análises: (hash BLAKE2b da imagem, prompt alvo)
+CacheKey = Tuple[bytes, str]
+
+# Número máximo de análises mantidas no cache (LRU)
+ANALYSIS_CACHE_SIZE = 4096
+
+# Tempo (segundos) que uma análise em cache continua válida
+ANALYSIS_CACHE_TTL = 3600
+
+# Número máximo de tentativas por requisição em caso de erro transitório
+RETRY_MAX_ATTEMPTS = 4
+
+# Espera base (segundos) do backoff exponencial entre tentativas
+RETRY_BASE_DELAY = 0.5
+
+# Espera máxima (segundos) entre tentativas
+RETRY_MAX_DELAY = 8.0
+
+# Status HTTP transitórios que justificam nova tentativa (rate limit e erros do servidor)
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Gerador próprio para o jitter: não disputa o estado global do módulo random
+_RNG = random.Random()
+
+# Feedback quando a resposta da IA não pôde ser interpretada
+_FALLBACK_FEEDBACK = "A IA ficou sem palavras com sua criatividade!"
+
+# Timeout por tentativa: conexão curta (endpoint inacessível falha rápido), leitura longa (geração da IA)
+REQUEST_TIMEOUT = httpx.Timeout(15.0, connect=2.0)
+
+# Status que indicam endpoint inexistente ou sem permissão (não adianta tentar de novo)
+DEAD_STATUS_CODES = frozenset({403, 404})
+
+# Cota da API esgotada: vale para a chave inteira, então outros endpoints também recusariam
+RATE_LIMITED_STATUS = 429
+
+# Arquivo onde o endpoint que funcionou é guardado entre reinícios (sem a chave de API)
+ENDPOINT_CACHE_FILE = Path(os.getenv("GEMINI_ENDPOINT_CACHE", Path.home() / ".cache" / "inkly" / "gemini.json"))
+
+# Tempo (segundos) em que a lista de modelos da conta (/v1/models) é reaproveitada
+MODELS_LIST_TTL = 600
+
+# Número de endpoints sondados em paralelo (models.get, sem custo) durante a descoberta
+HEDGE_SIZE = int(os.getenv("GEMINI_HEDGE_SIZE", "4"))
+
+# Número máximo de requisições simultâneas à API (as demais esperam na fila)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acentos, para comparar palpite e prompt alvo."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+class GeminiService:
+    """Integração com Google Gemini (Generative Language API).
+
+    - Usa `GEMINI_API_KEY` a partir do ambiente.
+    - Faz uma requisição simples ao endpoint `:generateContent` e tenta
+      extrair texto com palpites e confidências.
+    - Se não houver `GEMINI_API_KEY`, retorna um stub local.
+    """
+
+    # Modelo padrão a ser usado, obtido da variável de ambiente ou usando "gemini-2.0-flash" como padrão
+    DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+    # Cliente HTTP compartilhado por todas as instâncias (criado na primeira)
+    _shared_client: ClassVar[Optional[httpx.AsyncClient]] = None
+
+    # URLs que responderam 403/404, compartilhadas entre instâncias:
+    # uma instância nova não redescobre endpoints que já se sabe estarem mortos
+    _dead_endpoints: ClassVar[Set[str]] = set()
+
+    # Modelos listados por /v1/models e quando a lista expira, compartilhados entre instâncias:
+    # uma varredura sem sucesso não refaz a listagem a cada chamada
+    _models_cache: ClassVar[Optional[Tuple[float, List[str]]]] = None
+
+    @classmethod
+    def _ensure_client(cls) -> httpx.AsyncClient:
+        """Retorna o cliente HTTP compartilhado, criando-o na primeira chamada (ou após `aclose`).
+
+        Returns:
+            Cliente assíncrono com HTTP/2, pool de conexões e cabeçalhos JSON
+        """
+        if cls._shared_client is None or cls._shared_client.is_closed:
+            # Reaproveita conexões TLS/HTTP2 entre chamadas e entre instâncias
+            # Cabeçalhos fixos definidos uma vez: o corpo já vai serializado com orjson
+            cls._shared_client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                headers={"Content-Type": "application/json", "Accept": "application/json"},
+            )
+        return cls._shared_client
+
+    def __init__(self):
+        """Inicializa o serviço do Gemini."""
+        # Obtém a chave da API do ambiente
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        # Define o modelo a ser usado
+        self.model = self.DEFAULT_MODEL
+        # URLs a tentar (modelos configurados × versões da API), montadas uma única vez
+        self._endpoints: Tuple[str, ...] = self._build_endpoints(
+            [self.model, f"{self.model}-mini", os.getenv("GEMINI_MODEL_ALT", "text-bison-001")]
+        ) if self.api_key else ()
+        # Cache LRU de análises: hash(prompt + imagem) -> (expira_em, resultado)
+        self._cache: "OrderedDict[CacheKey, Tuple[float, dict]]" = OrderedDict()
+        # Fila de desenhos aguardando análise em lote: (imagem, prompt, future)
+        # Criada na primeira chamada, dentro do event loop em execução (e de novo após `aclose`)
+        self._batch_queue: Optional[asyncio.Queue] = None
+        # Tarefa que coleta a fila em lotes (criada na primeira chamada)
+        self._batch_worker: Optional[asyncio.Task] = None
+        # Referências aos lotes em execução (evita coleta pelo GC)
+        self._batch_tasks: set = set()
+        # Análises em andamento por chave do cache, para chamadores simultâneos do mesmo desenho compartilharem a chamada
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        # Última combinação (URL, índice do payload) que respondeu 200
+        # (persistida em disco, então instâncias novas já partem da descoberta anterior)
+        self._working_endpoint: Optional[Tuple[str, int]] = self._load_working_endpoint() if self.api_key else None
+        # Limita as chamadas simultâneas à API para não estourar a cota em picos
+        self._gate = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        # Requisições aguardando uma vaga no limite de concorrência
+        self._gate_waiting = 0
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartilhado entre instâncias, buscado a cada uso (nunca um já fechado)."""
+        return type(self)._ensure_client()
+
+    @property
+    def queue_depth(self) -> int:
+        """Número de requisições aguardando vaga para chamar a API."""
+        return self._gate_waiting
+
+    def _extract_text_from_response(self, result: Dict[str, Any]) -> str:
+        """Extrai o texto da resposta da API do Gemini.
+        
+        A API pode retornar diferentes formatos de resposta, então tentamos
+        múltiplas estratégias para extrair o texto.
+        
+        Args:
+            result: Dicionário com a resposta da API
+            
+        Returns:
+            String com o texto extraído ou vazio se não conseguir extrair
+        """
+        # Formato principal: candidates -> content -> parts -> text
+        # Navegação com isinstance, sem depender de exceções para chaves ausentes
+        candidates = result.get("candidates")
+        if isinstance(candidates, list) and candidates:
+            first = candidates[0]
+            content = first.get("content") if isinstance(first, dict) else None
+            parts = content.get("parts") if isinstance(content, dict) else None
+            if isinstance(parts, list) and parts and isinstance(parts[0], dict):
+                return parts[0].get("text", "")
+            # Candidato sem texto (ex.: bloqueado por segurança)
+            return ""
+
+        # Formato alternativo: outputs -> content -> [text] ou outputs -> text
+        outputs = result.get("outputs")
+        if isinstance(outputs, list):
+            for out in outputs:
+                if not isinstance(out, dict):
+                    continue
+                content = out.get("content")
+                if isinstance(content, list) and content:
+                    first = content[0]
+                    return first.get("text", "") if isinstance(first, dict) else str(first)
+                if "text" in out:
+                    return out["text"]
+
+        # Formato desconhecido: sem texto (quem chama já trata o vazio)
+        return ""
+
+    async def aclose(self):
+        """Fecha o cliente HTTP compartilhado e o coletor de lotes (chamado no shutdown da aplicação).
+
+        O serviço continua utilizável depois: o próximo uso (ex.: outro ciclo de
+        vida da aplicação no mesmo processo) abre um cliente e uma fila novos.
+        """
+        client, type(self)._shared_client = type(self)._shared_client, None
+        if client is not None:
+            await client.aclose()
+        # O coletor e a fila pertencem ao event loop que está terminando
+        if self._batch_worker is not None:
+            self._batch_worker.cancel()
+            await asyncio.gather(self._batch_worker, return_exceptions=True)
+        self._batch_worker = None
+        self._batch_queue = None
+        # O semáforo também fica preso ao loop em que alguém esperou por uma vaga
+        self._gate = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+    async def analyze_drawing(self, img_data: str, prompt_text: str) -> dict:
+        """Analisa uma imagem codificada em base64 junto ao prompt.
+
+        Retorna dicionário com chaves esperadas pelo `game_manager`/`main.py`:
+        - `guesses`: lista de strings com os palpites da IA
+        - `confidence`: inteiro 0-100 indicando confiança da IA
+        - `feedback`: texto com comentário sobre o desenho
+        - `reaction`: texto curto com reação da IA
+        - `correct`: boolean indicando se acertou
+        
+        Args:
+            img_data: String com a imagem codificada em base64
+            prompt_text: String com o prompt/palavra alvo do desenho
+            
+        Returns:
+            Dicionário com os resultados da análise
+        """
+        # Se não houver API key configurada, retorna um resultado stub (falso)
+        if not self.api_key:
+            return {
+                "guesses": [],
+                "confidence": 50,
+                "feedback": "No API key provided; returning stub result.",
+                "reaction": "no-api-key",
+                "correct": False,
+            }
+
+        # Desenho idêntico já analisado: devolve do cache sem chamar a API
+        cache_key = self._cache_key(img_data, prompt_text)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Mesmo desenho (bytes idênticos) já em análise para este alvo: espera a mesma chamada
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._analyze_uncached(img_data, prompt_text, cache_key))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+
+        # shield: se este jogador desistir, a chamada continua para os demais
+        analysis = await asyncio.shield(task)
+        return {**analysis, "guesses": list(analysis["guesses"])}
+
+    async def _analyze_uncached(self, img_data: str, prompt_text: str, cache_key: CacheKey) -> dict:
+        """Chama a API para um desenho que não está no cache e guarda o resultado.
+
+        Args:
+            img_data: String com a imagem codificada em base64
+            prompt_text: String com o prompt/palavra alvo do desenho
+            cache_key: Chave gerada por `_cache_key`
+
+        Returns:
+            Dicionário com os resultados da análise
+        """
+        # Payload multimodal: prompt + desenho como inline_data (só generateContent aceita imagens)
+        payload = self._image_payload(img_data, _PROMPT_TEMPLATE.format(target=prompt_text))
+
+        # Tenta os modelos/versões da API até um responder
+        result, last_exception = await self._generate([payload])
+
+        # Se todas as tentativas falharam, retorna erro
+        if result is None:
+            return self._error_result(last_exception)
+
+        # Extrai o texto da resposta (sem cercas de markdown) e tenta interpretá-lo como JSON
+        text = _FENCE_RE.sub("", self._extract_text_from_response(result).strip())
+        parsed = self._parse_json_text(text, _JSON_OBJECT_RE)
+
+        # Converte o JSON (ou o texto livre) no dicionário de resultado
+        analysis = self._build_analysis(parsed, text, prompt_text)
+
+        # Guarda no cache para reenvios do mesmo desenho
+        self._cache_put(cache_key, analysis)
+        return analysis
+
+    async def analyze_drawing_stream(self, img_data: str, prompt_text: str) -> AsyncIterator[Dict[str, Any]]:
+        """Analisa o desenho repassando o texto da IA à medida que ele chega.
+
+        Usa o endpoint `streamGenerateContent` (SSE) do modelo configurado e
+        produz eventos `{"type": "partial", "text": ...}` com cada trecho,
+        seguidos de `{"type": "final", "analysis": ...}` com o mesmo
+        dicionário de `analyze_drawing`. Se o streaming falhar, for
+        interrompido ou não devolver um objeto JSON, o evento final vem do
+        caminho normal (com todos os fallbacks) e nada é guardado no cache.
+
+        Args:
+            img_data: String com a imagem codificada em base64
+            prompt_text: String com o prompt/palavra alvo do desenho
+
+        Yields:
+            Dicionários de evento `partial` e, por último, um `final`
+        """
+        # Sem API key não há o que transmitir: devolve direto o stub
+        if not self.api_key:
+            yield {"type": "final", "analysis": await self.analyze_drawing(img_data, prompt_text)}
+            return
+
+        # Desenho idêntico já analisado: responde do cache
+        cache_key = self._cache_key(img_data, prompt_text)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            yield {"type": "final", "analysis": cached}
+            return
+
+        payload = self._image_payload(img_data, _PROMPT_TEMPLATE.format(target=prompt_text))
+        url = (
+            f"{_API_BASES[0]}/models/{self.model}"
+            f":streamGenerateContent?alt=sse&key={self.api_key}"
+        )
+
+        # A leitura do stream roda em outra tarefa e entrega os trechos por uma fila:
+        # a vaga no limite de concorrência não fica presa enquanto o cliente SSE consome os eventos
+        queue: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(self._read_stream(url, payload, queue))
+
+        # Trechos de texto recebidos até agora
+        chunks: List[str] = []
+        try:
+            while (text := await queue.get()) is not None:
+                chunks.append(text)
+                yield {"type": "partial", "text": text}
+            complete = await reader
+        finally:
+            # Cliente desconectou no meio do stream: encerra a leitura
+            reader.cancel()
+
+        # Junta os trechos; só uma resposta completa que virou objeto JSON é aproveitada
+        text = _FENCE_RE.sub("", "".join(chunks).strip())
+        parsed = self._parse_json_text(text, _JSON_OBJECT_RE) if complete else None
+
+        # Stream interrompido, vazio ou sem JSON: usa o caminho normal com todos os fallbacks
+        if not isinstance(parsed, dict):
+            yield {"type": "final", "analysis": await self.analyze_drawing(img_data, prompt_text)}
+            return
+
+        analysis = self._build_analysis(parsed, text, prompt_text)
+        self._cache_put(cache_key, analysis)
+        yield {"type": "final", "analysis": analysis}
+
+    async def _read_stream(self, url: str, payload: Dict[str, Any], queue: asyncio.Queue) -> bool:
+        """Lê o `streamGenerateContent` e coloca cada trecho de texto na fila.
+
+        A vaga no limite de concorrência é ocupada só durante a leitura, e a
+        fila sempre termina com None (inclusive em caso de erro).
+
+        Args:
+            url: URL do `streamGenerateContent` com `alt=sse`
+            payload: Corpo JSON da requisição
+            queue: Fila que recebe os trechos de texto
+
+        Returns:
+            True se a API respondeu 200 e o stream terminou sem erro
+        """
+        try:
+            async with self._slot():
+                async with self._client.stream(
+                    "POST", url, content=orjson.dumps(payload), timeout=REQUEST_TIMEOUT
+                ) as resp:
+                    if resp.status_code != 200:
+                        return False
+                    async for line in resp.aiter_lines():
+                        # Cada evento SSE traz um pedaço da resposta em "data: {...}"
+                        if not line.startswith("data:"):
+                            continue
+                        text = self._chunk_text(orjson.loads(line[5:]))
+                        if text:
+                            queue.put_nowait(text)
+            return True
+        except (httpx.HTTPError, ValueError):
+            # Conexão interrompida ou trecho inválido: a resposta está incompleta
+            return False
+        finally:
+            queue.put_nowait(None)
+
+    async def analyze_drawings_batch(self, items: List[Tuple[str, str]]) -> List[dict]:
+        """Analisa vários desenhos em uma única chamada `generateContent`.
+
+        Todas as imagens vão como partes `inline_data` do mesmo conteúdo e a
+        IA devolve um array JSON na ordem das imagens. Desenhos já presentes
+        no cache não são reenviados; se sobrar um único desenho, ou se o
+        array não tiver um objeto por desenho, os desenhos afetados usam o
+        caminho normal de `analyze_drawing`.
+
+        Args:
+            items: Lista de tuplas (imagem base64, prompt alvo), até BATCH_MAX_ITEMS
+
+        Returns:
+            Lista de dicionários no formato de `analyze_drawing`, na mesma ordem
+        """
+        # Sem API key ou com um único desenho, usa o caminho individual
+        if not self.api_key or len(items) <= 1:
+            return [await self.analyze_drawing(img_data, prompt_text) for img_data, prompt_text in items]
+
+        # Resolve pelo cache o que for possível; só os demais vão para a API
+        keys = [self._cache_key(img_data, prompt_text) for img_data, prompt_text in items]
+        results: List[Optional[dict]] = [self._cache_get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        # Nenhum ou apenas um desenho pendente: não compensa montar um lote
+        if len(pending) <= 1:
+            for i in pending:
+                results[i] = await self.analyze_drawing(*items[i])
+            return results
+
+        # Lista numerada dos prompts alvo, na ordem das imagens
+        targets = "\n".join(f"{n + 1}. {items[i][1]}" for n, i in enumerate(pending))
+
+        # Monta o prompt pedindo um resultado por imagem
+        user_prompt = (
+            f"Você recebe {len(pending)} desenhos, em ordem, e um prompt alvo para cada um. "
+            f"Retorne um array JSON com exatamente {len(pending)} objetos, na mesma ordem das imagens. "
+            "Cada objeto tem a chave 'guesses' contendo até 5 objetos {label, confidence}, "
+            "a chave 'feedback' com comentário breve e 'reaction' com uma palavra curta.\n"
+            f"Prompts alvo:\n{targets}"
+        )
+
+        # Texto seguido de uma parte inline_data por imagem
+        parts = [{"text": user_prompt}]
+        parts.extend({"inline_data": {"mime_type": "image/png", "data": items[i][0]}} for i in pending)
+        payload = {
+            "contents": [{"parts": parts}],
+            "generationConfig": {**_GENERATION_CONFIG, "maxOutputTokens": _GENERATION_CONFIG["maxOutputTokens"] * len(pending)},
+        }
+
+        # Apenas generateContent aceita imagens
+        result, last_exception = await self._generate([payload])
+        if result is None:
+            for i in pending:
+                results[i] = self._error_result(last_exception)
+            return results
+
+        # Extrai o array JSON com um objeto por imagem
+        text = _FENCE_RE.sub("", self._extract_text_from_response(result).strip())
+        parsed = self._parse_json_text(text, _JSON_ARRAY_RE)
+        if isinstance(parsed, dict):
+            parsed = parsed.get("results")
+
+        # Array de outro tamanho: não há como saber qual resposta é de qual desenho,
+        # então nenhum item é aproveitado e cada desenho é analisado individualmente
+        if not isinstance(parsed, list) or len(parsed) != len(pending):
+            parsed = [None] * len(pending)
+
+        retry = []
+        for item, i in zip(parsed, pending):
+            if isinstance(item, dict):
+                results[i] = self._build_analysis(item, "", items[i][1])
+                self._cache_put(keys[i], results[i])
+            else:
+                # Sem resposta válida para este desenho: não é pontuado como erro da IA
+                retry.append(i)
+
+        # Desenhos sem resposta no lote vão pelo caminho individual (cache, single-flight e fallbacks)
+        for i, analysis in zip(retry, await asyncio.gather(*(self.analyze_drawing(*items[i]) for i in retry))):
+            results[i] = analysis
+        return results
+
+    async def analyze_drawing_coalesced(self, img_data: str, prompt_text: str) -> dict:
+        """Enfileira um desenho para análise em lote e aguarda o resultado.
+
+        Desenhos que chegam dentro de uma janela de BATCH_WINDOW segundos são
+        agrupados (até BATCH_MAX_ITEMS) em uma única chamada à API. Feito
+        para quando vários jogadores enviam ao mesmo tempo (fim de rodada
+        multiplayer); um envio avulso deve usar `analyze_drawing`, que não
+        espera a janela.
+
+        Args:
+            img_data: String com a imagem codificada em base64
+            prompt_text: String com o prompt/palavra alvo do desenho
+
+        Returns:
+            Dicionário com os resultados da análise (mesmo formato de `analyze_drawing`)
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+        self._batch_queue.put_nowait((img_data, prompt_text, future))
+
+        # Inicia o coletor de lotes na primeira chamada (precisa do event loop rodando)
+        if self._batch_worker is None or self._batch_worker.done():
+            self._batch_worker = asyncio.create_task(self._collect_batches())
+
+        return await future
+
+    async def _collect_batches(self):
+        """Agrupa os desenhos enfileirados em lotes e dispara cada lote."""
+        loop = asyncio.get_running_loop()
+        while True:
+            # Espera o primeiro desenho e abre a janela de coleta
+            batch = [await self._batch_queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+
+            # Junta os desenhos que chegarem até o fim da janela ou até encher o lote
+            while len(batch) < BATCH_MAX_ITEMS:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._batch_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispara o lote sem bloquear a coleta do próximo
+            task = asyncio.create_task(self._flush_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _flush_batch(self, batch: List[Tuple[str, str, asyncio.Future]]):
+        """Executa um lote e entrega cada resultado ao seu chamador.
+
+        Args:
+            batch: Lista de tuplas (imagem base64, prompt alvo, future do chamador)
+        """
+        items = [(img_data, prompt_text) for img_data, prompt_text, _ in batch]
+        try:
+            results = await self.analyze_drawings_batch(items)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Ignora chamadores que já desistiram (future cancelada)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _generate(self, payloads: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+        """Envia os payloads ao `generateContent` até obter uma resposta 200 da API.
+
+        Tenta primeiro a última combinação que funcionou; depois os modelos
+        configurados e, se nenhum funcionar, os modelos listados pela própria API.
+
+        Args:
+            payloads: Formatos de payload a tentar, em ordem de preferência
+
+        Returns:
+            Tupla (resposta JSON ou None, última exceção ocorrida)
+        """
+        # Combinação que funcionou da última vez: tenta só ela antes da varredura completa
+        endpoint = self._working_endpoint
+        if endpoint is not None:
+            url, index = endpoint
+            if index < len(payloads):
+                try:
+                    resp = await self._post_with_retry(url, payloads[index])
+                    if resp.status_code == 200:
+                        return orjson.loads(resp.content), None
+                    # Cota esgotada: a varredura só geraria mais requisições recusadas
+                    if resp.status_code == RATE_LIMITED_STATUS:
+                        return None, self._status_error(resp)
+                except httpx.RequestError:
+                    pass
+                # Deixou de funcionar: esquece e refaz a varredura
+                self._working_endpoint = None
+
+        # URLs dos modelos configurados, montadas uma única vez no __init__
+        result, last_exception = await self._try_endpoints(self._endpoints, payloads)
+
+        # Se nenhuma tentativa funcionou (e não foi por cota esgotada), tenta descobrir modelos disponíveis
+        if result is None and not self._is_rate_limited(last_exception):
+            try:
+                # Modelos disponíveis na conta (lista em cache por MODELS_LIST_TTL)
+                fallback_models = await self._available_models()
+                if fallback_models:
+                    # Tenta novamente com os modelos descobertos
+                    result, fallback_exception = await self._try_endpoints(self._build_endpoints(fallback_models), payloads)
+                    if fallback_exception is not None:
+                        last_exception = fallback_exception
+            except Exception:
+                # Se falhar na listagem, ignora e devolve o erro das tentativas
+                pass
+
+        return result, last_exception
+
+    async def _available_models(self) -> List[str]:
+        """Lista os modelos da conta via `/v1/models`, reaproveitando a lista por MODELS_LIST_TTL.
+
+        Returns:
+            Nomes dos modelos sem o prefixo 'models/' (vazio se a API não respondeu 200)
+        """
+        cached = type(self)._models_cache
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        # Busca a lista de modelos disponíveis na conta
+        models_url = f"https://generativelanguage.googleapis.com/v1/models?key={self.api_key}"
+        ml = await self._client.get(models_url, timeout=10)
+        if ml.status_code != 200:
+            return []
+        available = orjson.loads(ml.content).get("models", [])
+        # Extrai os nomes dos modelos disponíveis, removendo o prefixo 'models/'
+        models = [m["name"].replace("models/", "") for m in available if m.get("name")]
+        type(self)._models_cache = (time.monotonic() + MODELS_LIST_TTL, models)
+        return models
+
+    async def _try_endpoints(self, urls: Tuple[str, ...], payloads: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+        """Percorre as URLs em ordem de preferência e para na primeira resposta 200.
+
+        Cada grupo de HEDGE_SIZE URLs é sondado em paralelo com `models.get`
+        (gratuito), descartando modelos inexistentes sem enviar o desenho. O
+        payload completo (cobrado) vai a uma URL por vez, então um modelo
+        alternativo nunca é escolhido só por ter respondido mais rápido. Um
+        429 encerra a varredura: a cota é da chave, não do endpoint.
+
+        Args:
+            urls: URLs completas geradas por `_build_endpoints`, em ordem de preferência
+            payloads: Formatos de payload a tentar
+
+        Returns:
+            Tupla (resposta JSON ou None, última exceção ocorrida)
+        """
+        last_exception = None
+        # Endpoints que já responderam 403/404 não são tentados de novo
+        live = [url for url in urls if url not in self._dead_endpoints]
+        for start in range(0, len(live), HEDGE_SIZE):
+            group = live[start:start + HEDGE_SIZE]
+            await self._probe(group)
+            for url in group:
+                # Sondagem respondeu 403/404: modelo inexistente ou sem permissão
+                if url in self._dead_endpoints:
+                    continue
+                for i, payload in enumerate(payloads):
+                    try:
+                        resp = await self._post_with_retry(url, payload)
+                    except httpx.RequestError as e:
+                        # Erro de rede/timeout, armazena e tenta o próximo
+                        last_exception = e
+                        continue
+                    if resp.status_code == 200:
+                        # Memoriza a combinação para as próximas chamadas irem direto nela
+                        if self._working_endpoint != (url, i):
+                            self._working_endpoint = (url, i)
+                            self._save_working_endpoint()
+                        return orjson.loads(resp.content), None
+                    last_exception = self._status_error(resp)
+                    # Cota esgotada: os demais endpoints também recusariam
+                    if resp.status_code == RATE_LIMITED_STATUS:
+                        return None, last_exception
+                    # Modelo/versão inexistente ou sem permissão: descarta a URL de vez
+                    if resp.status_code in DEAD_STATUS_CODES:
+                        self._dead_endpoints.add(url)
+                        break
+        return None, last_exception
+
+    async def _probe(self, urls: List[str]) -> None:
+        """Consulta `models.get` das URLs em paralelo e marca as inexistentes como mortas.
+
+        A consulta não é cobrada e não passa pelo limite de concorrência.
+        Falhas de rede ou outros status não marcam nada: quem decide é a
+        tentativa real com o payload.
+
+        Args:
+            urls: URLs de `generateContent` geradas por `_build_endpoints`
+        """
+        async def probe(url: str) -> None:
+            try:
+                # .../models/{modelo}:generateContent?key=... -> .../models/{modelo}?key=...
+                resp = await self._client.get(url.replace(":generateContent", "", 1), timeout=REQUEST_TIMEOUT)
+            except httpx.RequestError:
+                return
+            if resp.status_code in DEAD_STATUS_CODES:
+                self._dead_endpoints.add(url)
+
+        await asyncio.gather(*(probe(url) for url in urls))
+
+    def _load_working_endpoint(self) -> Optional[Tuple[str, int]]:
+        """Lê do disco o endpoint que funcionou na execução anterior.
+
+        Só é aceito um endpoint que esteja entre os montados para o modelo
+        configurado agora (`self._endpoints`).
+
+        Returns:
+            Tupla (URL com a chave de API atual, índice do payload) ou None
+        """
+        try:
+            saved = orjson.loads(ENDPOINT_CACHE_FILE.read_bytes())
+            url, index = f"{saved['endpoint']}?key={self.api_key}", int(saved["payload_index"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # Arquivo ausente ou inválido: faz a descoberta normalmente
+            return None
+        # Gravado para outro modelo (GEMINI_MODEL mudou desde então): ignora e refaz a descoberta
+        if url not in self._endpoints:
+            return None
+        return url, index
+
+    def _save_working_endpoint(self) -> None:
+        """Grava o endpoint que funcionou, sem a chave de API, para o próximo início."""
+        url, index = self._working_endpoint
+        try:
+            ENDPOINT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            ENDPOINT_CACHE_FILE.write_bytes(orjson.dumps({"endpoint": url.partition("?")[0], "payload_index": index}))
+        except OSError:
+            # Sem permissão de escrita: o endpoint continua valendo só em memória
+            pass
+
+    def _build_endpoints(self, models: List[str]) -> Tuple[str, ...]:
+        """Monta as URLs de `generateContent` para cada modelo e versão da API.
+
+        Args:
+            models: Modelos em ordem de preferência (vazios são ignorados)
+
+        Returns:
+            Tupla de URLs completas, com a chave de API, na ordem de tentativa
+        """
+        return tuple(
+            f"{base}/models/{model}:generateContent?key={self.api_key}"
+            for model, base in product(filter(None, models), _API_BASES)
+        )
+
+    @staticmethod
+    def _cache_key(img_data: str, prompt_text: str) -> CacheKey:
+        """Chave do cache: (BLAKE2b de 16 bytes da imagem base64, prompt alvo)."""
+        return hashlib.blake2b(img_data.encode(), digest_size=16).digest(), prompt_text
+
+    def _cache_get(self, key: CacheKey) -> Optional[dict]:
+        """Busca uma análise no cache, descartando entradas expiradas.
+
+        Args:
+            key: Chave gerada por `_cache_key`
+
+        Returns:
+            Cópia do resultado em cache ou None
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+
+        # Marca como usada recentemente e devolve uma cópia
+        self._cache.move_to_end(key)
+        return {**result, "guesses": list(result["guesses"])}
+
+    def _cache_put(self, key: CacheKey, result: dict):
+        """Guarda uma análise no cache, removendo as mais antigas acima do limite.
+
+        Args:
+            key: Chave gerada por `_cache_key`
+            result: Resultado da análise
+        """
+        self._cache[key] = (time.monotonic() + ANALYSIS_CACHE_TTL, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > ANALYSIS_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def _post_with_retry(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        """POST com backoff exponencial e jitter para erros transitórios.
+
+        Repete em 429/5xx e em falhas de transporte até RETRY_MAX_ATTEMPTS
+        vezes, respeitando o cabeçalho `Retry-After` quando presente. Cada
+        tentativa passa pelo limite de concorrência (GEMINI_MAX_CONCURRENCY).
+
+        Args:
+            url: URL completa do endpoint
+            payload: Corpo JSON da requisição
+
+        Returns:
+            A última resposta recebida (pode ser um erro se as tentativas acabaram)
+
+        Raises:
+            httpx.TransportError: Se a última tentativa falhar na rede
+        """
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            last_attempt = attempt == RETRY_MAX_ATTEMPTS - 1
+            try:
+                resp = await self._gated_post(url, payload)
+            except httpx.TransportError:
+                # Erro de rede/timeout: tenta de novo, a menos que seja a última tentativa
+                if last_attempt:
+                    raise
+                delay = self._retry_delay(attempt, None)
+            else:
+                # Respostas definitivas (sucesso ou erro não transitório) voltam direto
+                if resp.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return resp
+                delay = self._retry_delay(attempt, resp.headers.get("Retry-After"))
+            await asyncio.sleep(delay)
+
+    async def _gated_post(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        """Faz um POST respeitando o limite de chamadas simultâneas.
+
+        A vaga é liberada ao fim de cada tentativa, então quem está no
+        backoff não segura a fila dos demais.
+
+        Args:
+            url: URL completa do endpoint
+            payload: Corpo JSON da requisição
+
+        Returns:
+            A resposta da API
+        """
+        async with self._slot():
+            # Serializa com orjson em vez do json da biblioteca padrão
+            return await self._client.post(url, content=orjson.dumps(payload), timeout=REQUEST_TIMEOUT)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Ocupa uma vaga do limite de concorrência, contando quem espera na fila."""
+        self._gate_waiting += 1
+        try:
+            await self._gate.acquire()
+        finally:
+            self._gate_waiting -= 1
+        try:
+            yield
+        finally:
+            self._gate.release()
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+        """Calcula a espera antes da próxima tentativa.
+
+        Usa o `Retry-After` da API (em segundos) se existir; caso contrário,
+        jitter completo sobre um backoff exponencial limitado a RETRY_MAX_DELAY.
+
+        Args:
+            attempt: Índice da tentativa que falhou (começa em 0)
+            retry_after: Valor do cabeçalho Retry-After, se houver
+
+        Returns:
+            Tempo de espera em segundos
+        """
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), RETRY_MAX_DELAY)
+            except ValueError:
+                # Formato de data HTTP: ignora e usa o backoff normal
+                pass
+        return _RNG.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+    @staticmethod
+    def _image_payload(img_data: str, user_prompt: str) -> Dict[str, Any]:
+        """Payload `generateContent` com o prompt e o desenho como inline_data.
+
+        Args:
+            img_data: String com a imagem codificada em base64
+            user_prompt: Texto do prompt já formatado
+
+        Returns:
+            Dicionário pronto para ser serializado
+        """
+        return {
+            "contents": [{"parts": [
+                {"text": user_prompt},
+                {"inline_data": {"mime_type": "image/png", "data": img_data}},
+            ]}],
+            "generationConfig": _GENERATION_CONFIG,
+        }
+
+    @staticmethod
+    def _chunk_text(event: Dict[str, Any]) -> str:
+        """Extrai o texto de um evento do `streamGenerateContent`.
+
+        Eventos sem texto (ex.: o último, só com metadados de uso) viram "".
+
+        Args:
+            event: Evento SSE já convertido de JSON
+
+        Returns:
+            Texto do trecho ou string vazia
+        """
+        try:
+            return event["candidates"][0]["content"]["parts"][0].get("text", "")
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return ""
+
+    @staticmethod
+    def _status_error(resp: httpx.Response) -> httpx.HTTPStatusError:
+        """Exceção com o status e o corpo de uma resposta de erro da API."""
+        return httpx.HTTPStatusError(f"{resp.status_code} {resp.text}", request=resp.request, response=resp)
+
+    @staticmethod
+    def _is_rate_limited(exception: Optional[Exception]) -> bool:
+        """True se a última falha foi a cota da API esgotada (429)."""
+        return isinstance(exception, httpx.HTTPStatusError) and exception.response.status_code == RATE_LIMITED_STATUS
+
+    @staticmethod
+    def _error_result(last_exception: Optional[Exception]) -> dict:
+        """Resultado devolvido quando todas as tentativas na API falharam."""
+        return {
+            "guesses": [],
+            "confidence": 0,
+            "feedback": f"Request error: {last_exception}",
+            "reaction": "error",
+            "correct": False,
+        }
+
+    @staticmethod
+    def _parse_json_text(text: str, pattern: "re.Pattern[str]") -> Any:
+        """Faz parse do texto como JSON, procurando um trecho JSON se necessário.
+
+        Args:
+            text: Texto retornado pela IA
+            pattern: Regex pré-compilada do trecho (_JSON_OBJECT_RE ou _JSON_ARRAY_RE)
+
+        Returns:
+            Objeto JSON decodificado ou None
+        """
+        try:
+            return orjson.loads(text)
+        except ValueError:
+            pass
+        # Se falhar, procura o trecho JSON dentro do texto em uma única busca
+        match = pattern.search(text)
+        if match is None:
+            return None
+        try:
+            return orjson.loads(match.group())
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _build_analysis(parsed: Any, text: str, prompt_text: str) -> dict:
+        """Converte a resposta interpretada da IA no dicionário de resultado.
+
+        Args:
+            parsed: Objeto JSON da resposta (ou None se não houve parse)
+            text: Texto bruto da resposta, usado como fallback
+            prompt_text: Prompt alvo, usado para avaliar se a IA acertou
+
+        Returns:
+            Dicionário com guesses, confidence, feedback, reaction e correct
+        """
+        # Valores padrão para o retorno
+        guesses: List[str] = []
+        confidence = 50
+        feedback = ""
+        reaction = "thinking"
+        correct = False
+
+        # Se conseguiu fazer parse do JSON, extrai os dados
+        if isinstance(parsed, dict):
+            # Obtém a lista de palpites (pode estar em 'guesses' ou 'predictions')
+            g = parsed.get("guesses") or parsed.get("predictions")
+            if isinstance(g, list):
+                # Extrai até 5 palpites, convertendo para string uma única vez (sem copiar a lista)
+                guesses = [str(item.get("label", "")) if isinstance(item, dict) else str(item) for item in islice(g, 5)]
+                # Tenta pegar o valor de confidence do primeiro palpite
+                first = g[0] if g else None
+                if isinstance(first, dict) and first.get("confidence") is not None:
+                    try:
+                        # Aceita 87, 87.5 ou "87" e limita a 0-100 (o modelo de resposta exige int)
+                        confidence = min(max(int(float(first.get("confidence"))), 0), 100)
+                    except Exception:
+                        pass
+            # Extrai feedback e reaction, sempre como texto (a IA pode devolver números, listas etc.)
+            feedback = str(parsed.get("feedback") or parsed.get("comment") or "")
+            reaction = parsed.get("reaction")
+            reaction = str(reaction) if reaction is not None else "thinking"
+            # Avalia se acertou comparando o primeiro palpite com o prompt
+            if guesses:
+                # Normaliza cada texto uma única vez ("Cão" e "cao" contam como iguais)
+                target = _fold(prompt_text)
+                guess = _fold(guesses[0])
+                correct = bool(guess) and (target in guess or guess in target)
+        else:
+            # Fallback: se não conseguiu fazer parse, tenta extrair algo do texto
+            lines = [l.strip() for l in text.splitlines() if l.strip()]
+            if lines:
+                # Usa a primeira linha como palpite
+                guesses = [lines[0]]
+                # Mensagem amigável de fallback
+                feedback = _FALLBACK_FEEDBACK
+            else:
+                # Se não há nada, usa mensagem padrão
+                feedback = _FALLBACK_FEEDBACK
+
+        # Retorna o resultado estruturado
+        return {
+            "guesses": guesses,
+            "confidence": confidence,
+            "feedback": feedback,
+            "reaction": reaction,
+            "correct": correct,
+        }
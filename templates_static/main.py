@@ -1,23 +1,80 @@
 # Importações do FastAPI para criação de aplicação web
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Optional
+from jinja2 import Environment, FileSystemLoader
+from PIL import Image
+from io import BytesIO
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import logging.handlers
+import orjson
 import os
+import pybase64
+import queue
+import time
 
 # Importações dos serviços customizados do projeto
 from gemini_service import GeminiService
 from game_manager import GameManager
-from models import Difficulty
+from models import AchievementSystem, BrushType, Difficulty, DrawingSession
+from schemas import (
+    CompleteSessionRequest, CreatePlayerRequest, PlayerStats,
+    SessionCompleteResponse, StartSessionRequest
+)
+
+# Logger da aplicação: os handlers só enfileiram as mensagens, e uma thread
+# separada (QueueListener) faz a escrita no terminal fora do event loop
+logger = logging.getLogger("inkly")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação
+    Na inicialização, inicia a thread que escreve as mensagens de log enfileiradas;
+    no encerramento, fecha as conexões HTTP mantidas abertas pelo serviço do Gemini e esvazia a fila de log
+    """
+    _log_listener.start()
+    try:
+        yield
+    finally:
+        await gemini_service.aclose()
+        _log_listener.stop()
 
 # Inicialização da aplicação FastAPI
 # FastAPI é o framework web usado para criar a API REST
-app = FastAPI(title="Inkly")
+# Respostas JSON são serializadas com orjson (mais rápido que o json padrão)
+app = FastAPI(title="Inkly", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Em desenvolvimento (INKLY_DEBUG=1) os templates são recarregados e re-renderizados a cada acesso
+INKLY_DEBUG = os.getenv("INKLY_DEBUG", "") == "1"
 
 # Configuração do motor de templates Jinja2
 # Templates são os arquivos HTML que serão renderizados
-templates = Jinja2Templates(directory="templates")
+# Fora do modo debug: sem stat() do arquivo a cada render e cache de templates sem limite
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=True,
+    auto_reload=INKLY_DEBUG,
+    cache_size=-1,
+))
+
+# Compila todos os templates na inicialização (erros de sintaxe aparecem já no boot)
+for _name in templates.env.list_templates():
+    templates.get_template(_name)
+
+# HTML já renderizado das páginas que não dependem da requisição: template -> HTML
+_STATIC_PAGES: Dict[str, str] = {}
 
 # Montagem da pasta de arquivos estáticos (CSS, JS, imagens)
 # Todos os arquivos em /static estarão acessíveis via URL /static/...
@@ -27,15 +84,80 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 game_manager = GameManager()  # Gerencia jogadores, sessões e pontuação
 gemini_service = GeminiService()  # Serviço de IA para analisar desenhos
 
+# Tempo (segundos) em que navegadores e proxies podem reutilizar a página de ranking
+LEADERBOARD_PAGE_MAX_AGE = 15
+
+# Tempo (segundos) em que um resultado de /api/session/complete_async espera ser buscado
+SESSION_RESULT_TTL = 300
+
+# Resultados das sessões finalizadas em segundo plano: session_id -> (criado_em, estado)
+# Mantidos em ordem de criação para descartar os expirados a partir do início
+_session_results: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+# Referências às análises em segundo plano (evita coleta pelo GC)
+_session_tasks: set = set()
+
+# Lado máximo (pixels) do desenho enviado à IA; o canvas original é bem maior
+DRAWING_MAX_SIZE = int(os.getenv("DRAWING_MAX_SIZE", "256"))
+
+def _prepare_image(img_data: str) -> str:
+    """
+    Reduz o desenho antes de enviá-lo ao Gemini
+    Redimensiona para no máximo DRAWING_MAX_SIZE pixels e converte para tons
+    de cinza, o que encolhe o corpo da requisição e os tokens de imagem.
+    Se a imagem não puder ser lida, devolve o base64 original.
+    """
+    try:
+        img = Image.open(BytesIO(pybase64.b64decode(img_data, validate=False)))
+        img.thumbnail((DRAWING_MAX_SIZE, DRAWING_MAX_SIZE), Image.LANCZOS)
+        # Pixels transparentes do canvas viram fundo branco (e não preto) na conversão
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGBA", img.size, "white")
+            background.alpha_composite(img)
+            img = background
+        img = img.convert("L")
+        buffer = BytesIO()
+        img.save(buffer, format="PNG", optimize=True, compress_level=9)
+        return pybase64.b64encode(buffer.getvalue()).decode("ascii")
+    except Exception as e:
+        logger.warning("Falha ao reduzir desenho, enviando original: %s", e)
+        return img_data
+
+def _process_drawing(drawing_data: str) -> Tuple[str, str]:
+    """
+    Todo o trabalho de CPU sobre o desenho recebido, feito em uma só ida à thread
+    Remove o prefixo da data URL, calcula o hash e reduz a imagem.
+    Retorna (imagem base64 reduzida, hash do desenho original).
+    """
+    # Extrai apenas os dados base64 da imagem (remove o prefixo "data:image/png;base64,")
+    img_data = drawing_data.partition(",")[2] or drawing_data
+    
+    # Identifica o desenho por um hash curto; a imagem em si não fica guardada na sessão
+    # (utf-8: um corpo com caracteres fora do base64 não derruba a rota com erro 500)
+    drawing_hash = hashlib.blake2b(img_data.encode("utf-8"), digest_size=16).hexdigest()
+    
+    return _prepare_image(img_data), drawing_hash
+
+def _static_page(name: str) -> HTMLResponse:
+    """
+    Retorna uma página sem dados dinâmicos, renderizando o template só no primeiro acesso
+    (ou em todo acesso com INKLY_DEBUG=1, para editar o HTML sem reiniciar)
+    """
+    html = _STATIC_PAGES.get(name)
+    if html is None or INKLY_DEBUG:
+        html = _STATIC_PAGES[name] = templates.get_template(name).render()
+    return HTMLResponse(html)
+
 # ===== ROTAS DE PÁGINAS HTML =====
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """
     Rota principal da aplicação - Página inicial
-    Renderiza o arquivo index.html com a tela de boas-vindas
+    Renderiza o arquivo index.html com a tela de boas-vindas (HTML em cache)
     """
-    return templates.TemplateResponse("index.html", {"request": request})
+    return _static_page("index.html")
 
 @app.get("/game", response_class=HTMLResponse)
 async def game_page(request: Request, player_id: str):
@@ -59,9 +181,9 @@ async def game_page(request: Request, player_id: str):
 async def test_minimal(request: Request):
     """
     Rota de teste minimalista
-    Renderiza uma versão simplificada do jogo para testes e debug
+    Renderiza uma versão simplificada do jogo para testes e debug (HTML em cache)
     """
-    return templates.TemplateResponse("test_minimal.html", {"request": request})
+    return _static_page("test_minimal.html")
 
 @app.get("/leaderboard", response_class=HTMLResponse)
 async def leaderboard_page(request: Request):
@@ -69,26 +191,29 @@ async def leaderboard_page(request: Request):
     Rota da página de ranking
     Busca os top 20 jogadores e renderiza a tabela de classificação
     """
-    # Obtém os 20 melhores jogadores do ranking
-    leaderboard = game_manager.get_leaderboard(limit=20)
+    # Obtém os 20 melhores jogadores do ranking (cache stale-while-revalidate)
+    leaderboard = await game_manager.get_cached_leaderboard(limit=20)
     
-    # Renderiza a página passando os dados do ranking
-    return templates.TemplateResponse("leaderboard.html", {"request": request, "leaderboard": leaderboard})
+    # Renderiza a página passando os dados do ranking (cacheável por alguns segundos)
+    return templates.TemplateResponse(
+        "leaderboard.html",
+        {"request": request, "leaderboard": leaderboard},
+        headers={"Cache-Control": f"public, max-age={LEADERBOARD_PAGE_MAX_AGE}"}
+    )
 
 # ===== ROTAS DA API REST =====
 
 @app.post("/api/player/create")
-async def create_player(request: Request):
+async def create_player(body: CreatePlayerRequest):
     """
     API para criar um novo jogador
     Recebe: { "name": "Nome do Jogador" }
     Retorna: Dados do jogador criado (id, nome, level, xp)
     """
-    # Extrai os dados JSON do corpo da requisição
-    data = await request.json()
-    name = data.get("name")
+    # Corpo já validado pelo FastAPI/Pydantic (422 se faltar o nome)
+    name = body.name
     
-    # Validação: nome é obrigatório
+    # Validação: nome não pode ser vazio
     if not name:
         raise HTTPException(status_code=400, detail="Nome obrigatorio")
     
@@ -99,11 +224,12 @@ async def create_player(request: Request):
     return {"player_id": player.id, "name": player.name, "level": player.level, "xp": player.xp}
 
 @app.get("/api/player/{player_id}")
-async def get_player(player_id: str):
+async def get_player(player_id: str, request: Request, response: Response):
     """
     API para buscar dados de um jogador específico
     Recebe: player_id na URL
     Retorna: Dados completos do jogador (stats, conquistas, pincéis desbloqueados)
+    ou 304 sem corpo se o ETag enviado pelo cliente ainda for o atual
     """
     # Busca o jogador pelo ID
     player = game_manager.get_player(player_id)
@@ -112,6 +238,14 @@ async def get_player(player_id: str):
     if not player:
         raise HTTPException(status_code=404, detail="Jogador nao encontrado")
     
+    # ETag fraco: toda sessão finalizada muda o XP e o total de desenhos
+    # no-cache faz o navegador sempre revalidar (e receber 304 se nada mudou)
+    etag = f'W/"{player.level}-{player.xp}-{player.total_drawings}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
     # Retorna todos os dados do jogador
     return {
         "id": player.id,
@@ -121,27 +255,40 @@ async def get_player(player_id: str):
         "streak": player.streak,  # Sequência de acertos
         "total_drawings": player.total_drawings,  # Total de desenhos feitos
         "correct_guesses": player.correct_guesses,  # Total de acertos da IA
-        "brushes_unlocked": [b.value for b in player.brushes_unlocked],  # Pincéis desbloqueados
-        "achievements": player.achievements  # Lista de conquistas
+        # Conjuntos viram listas na ordem em que pincéis/conquistas são declarados
+        "brushes_unlocked": [b.value for b in BrushType if player.has_brush(b)],  # Pincéis desbloqueados
+        "achievements": [a for a in AchievementSystem.ACHIEVEMENTS if a in player.achievements]  # Lista de conquistas
     }
 
+@app.get("/api/leaderboard")
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100)):
+    """
+    API para buscar o ranking dos melhores jogadores
+    Recebe: limit na query string (1 a 100, padrão 10)
+    Retorna: Lista ordenada com rank, nome, nível, XP, desenhos, precisão e sequência
+    """
+    # Usa o mesmo cache stale-while-revalidate da página de ranking
+    return await game_manager.get_cached_leaderboard(limit=limit)
+
 @app.post("/api/session/start")
-async def start_session(request: Request):
+async def start_session(body: StartSessionRequest):
     """
     API para iniciar uma nova sessão de jogo
     Recebe: { "player_id": "id", "difficulty": "easy|medium|hard", "surprise_mode": true|false }
     Retorna: ID da sessão e o prompt/desafio para o jogador desenhar
     """
-    # Extrai os dados da requisição
-    data = await request.json()
-    player_id = data.get("player_id")
-    difficulty_str = data.get("difficulty", "medium")  # Padrão: medium
-    surprise_mode = data.get("surprise_mode", True)  # Padrão: modo surpresa ativo
+    # Corpo já validado pelo FastAPI/Pydantic (com os valores padrão aplicados)
+    player_id = body.player_id
+    difficulty_str = body.difficulty  # Padrão: medium
+    surprise_mode = body.surprise_mode  # Padrão: modo surpresa ativo
     
     try:
-        # Mapeia a string de dificuldade para o enum Difficulty
-        dif_map = {"easy": Difficulty.EASY, "medium": Difficulty.MEDIUM, "hard": Difficulty.HARD}
-        dif = dif_map.get(difficulty_str, Difficulty.MEDIUM)
+        # Converte a string no enum pelo próprio valor (busca O(1) no mapa interno do Enum)
+        try:
+            dif = Difficulty(difficulty_str)
+        except ValueError:
+            # Valor desconhecido: usa o padrão
+            dif = Difficulty.MEDIUM
         
         # Inicia uma nova sessão de jogo
         session = game_manager.start_session(player_id, difficulty=dif, surprise_mode=surprise_mode)
@@ -159,18 +306,42 @@ async def start_session(request: Request):
         # Se o jogador não for encontrado, retorna erro 404
         raise HTTPException(status_code=404, detail=str(e))
 
-@app.post("/api/session/complete")
-async def complete_session(request: Request):
+def _session_response(result: dict, ai_result: dict) -> SessionCompleteResponse:
+    """
+    Monta a resposta de uma sessão finalizada (usada pela rota normal e pelo streaming)
+    """
+    session = result["session"]
+    player = session.player
+    return SessionCompleteResponse(
+        correct=session.correct,  # Se a IA acertou
+        guesses=session.ai_guesses,  # Palpites da IA
+        confidence=ai_result.get("confidence", 50),  # Confiança da IA (0-100%)
+        feedback=ai_result.get("feedback", ""),  # Feedback textual da IA
+        reaction=ai_result.get("reaction", "thinking"),  # Reação da IA (emoji/texto)
+        score=result["rewards"]["score"],  # Pontos ganhos
+        xp_gained=result["rewards"]["xp"],  # XP ganho
+        achievements=result["achievements"],  # Novas conquistas desbloqueadas
+        level_up=result["level_up"],  # Se subiu de nível
+        new_level=result["new_level"],  # Novo nível (se level_up = true)
+        player_stats=PlayerStats(  # Estatísticas atualizadas do jogador
+            level=player.level,
+            xp=player.xp,
+            streak=player.streak,
+            total_drawings=player.total_drawings
+        )
+    )
+
+@app.post("/api/session/complete", response_model=SessionCompleteResponse)
+async def complete_session(body: CompleteSessionRequest):
     """
     API para finalizar uma sessão de jogo e avaliar o desenho
     Recebe: { "session_id": "id", "drawing_data": "base64", "time_spent": segundos }
     Retorna: Resultado da avaliação, pontos ganhos, XP, conquistas e level up
     """
-    # Extrai os dados da requisição
-    data = await request.json()
-    session_id = data.get("session_id")
-    drawing_data = data.get("drawing_data")  # Imagem em base64
-    time_spent = data.get("time_spent", 0)  # Tempo gasto desenhando
+    # Corpo já validado pelo FastAPI/Pydantic
+    session_id = body.session_id
+    drawing_data = body.drawing_data  # Imagem em base64
+    time_spent = body.time_spent  # Tempo gasto desenhando
     
     try:
         # Busca a sessão pelo ID
@@ -178,45 +349,173 @@ async def complete_session(request: Request):
         if not session:
             raise HTTPException(status_code=404, detail="Sessao nao encontrada")
         
-        # Extrai apenas os dados base64 da imagem (remove o prefixo "data:image/png;base64,")
-        img_data = drawing_data.split(",")[1] if "," in drawing_data else drawing_data
+        # Decodifica, calcula o hash e reduz a imagem em uma thread para não travar o event loop
+        img_data, drawing_hash = await asyncio.to_thread(_process_drawing, drawing_data)
         
-        # Envia o desenho para a IA Gemini analisar
-        ai_result = gemini_service.analyze_drawing(img_data, session.prompt.text)
+        # Envia o desenho para a IA Gemini analisar (await: o event loop segue atendendo outros jogadores)
+        # Chamada individual: o lote (analyze_drawing_coalesced) fica para o fim de rodada multiplayer
+        ai_result = await gemini_service.analyze_drawing(img_data, session.prompt.text)
         
         # Finaliza a sessão e calcula pontos, XP e conquistas
-        result = game_manager.complete_session(session_id, drawing_data, ai_result, time_spent)
+        result = game_manager.complete_session(session_id, drawing_hash, ai_result, time_spent)
         
         # Retorna todos os resultados da sessão
-        return {
-            "correct": result["session"].correct,  # Se a IA acertou
-            "guesses": result["session"].ai_guesses,  # Palpites da IA
-            "confidence": ai_result.get("confidence", 50),  # Confiança da IA (0-100%)
-            "feedback": ai_result.get("feedback", ""),  # Feedback textual da IA
-            "reaction": ai_result.get("reaction", "thinking"),  # Reação da IA (emoji/texto)
-            "score": result["rewards"]["score"],  # Pontos ganhos
-            "xp_gained": result["rewards"]["xp"],  # XP ganho
-            "achievements": result["achievements"],  # Novas conquistas desbloqueadas
-            "level_up": result["level_up"],  # Se subiu de nível
-            "new_level": result["new_level"],  # Novo nível (se level_up = true)
-            "player_stats": {  # Estatísticas atualizadas do jogador
-                "level": result["session"].player.level,
-                "xp": result["session"].player.xp,
-                "streak": result["session"].player.streak,
-                "total_drawings": result["session"].player.total_drawings
-            }
-        }
+        return _session_response(result, ai_result)
+    except HTTPException:
+        # Erros HTTP já definidos (ex.: 404 de sessão inexistente) seguem com o próprio status
+        raise
     except Exception as e:
-        # Em caso de erro, imprime no console e retorna erro 500
-        print(f"Erro: {e}")
+        # Em caso de erro, registra no log (com traceback) e retorna erro 500
+        logger.exception("Erro ao finalizar a sessao %s", session_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/session/complete_stream")
+async def complete_session_stream(body: CompleteSessionRequest):
+    """
+    Versão em streaming (Server-Sent Events) de /api/session/complete
+    Recebe o mesmo corpo e envia eventos "partial" com o texto da IA conforme
+    ele chega, seguidos de um evento "final" com o mesmo resultado da rota normal
+    """
+    # Corpo já validado pelo FastAPI/Pydantic
+    session_id = body.session_id
+    drawing_data = body.drawing_data  # Imagem em base64
+    time_spent = body.time_spent  # Tempo gasto desenhando
+    
+    # Busca a sessão pelo ID antes de abrir o stream (erro vira 404 normal)
+    session = game_manager.sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessao nao encontrada")
+    
+    # Decodifica, calcula o hash e reduz a imagem em uma thread para não travar o event loop
+    img_data, drawing_hash = await asyncio.to_thread(_process_drawing, drawing_data)
+    
+    async def events():
+        async for event in gemini_service.analyze_drawing_stream(img_data, session.prompt.text):
+            # O evento final da IA é pontuado e substituído pelo resultado completo da sessão
+            if event["type"] == "final":
+                ai_result = event["analysis"]
+                try:
+                    result = game_manager.complete_session(session_id, drawing_hash, ai_result, time_spent)
+                except ValueError as e:
+                    # Sessão já finalizada por outra requisição
+                    event = {"type": "error", "detail": str(e)}
+                else:
+                    event = {"type": "final", **_session_response(result, ai_result).model_dump()}
+            yield f"data: {orjson.dumps(event).decode()}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def _complete_in_background(session: DrawingSession, drawing_data: str, time_spent: float, created_at: float):
+    """
+    Analisa o desenho e pontua a sessão (já retirada por claim_session) fora da requisição
+    Usado por complete_async; guarda o resultado (ou o erro) em _session_results para o cliente buscar
+    """
+    session_id = session.session_id
+    scored = False
+    try:
+        # Mesmo fluxo de /api/session/complete
+        img_data, drawing_hash = await asyncio.to_thread(_process_drawing, drawing_data)
+        ai_result = await gemini_service.analyze_drawing(img_data, session.prompt.text)
+        scored = True
+        result = game_manager.score_session(session, drawing_hash, ai_result, time_spent)
+        state = {"status": "done", "result": _session_response(result, ai_result).model_dump()}
+    except Exception as e:
+        # Em caso de erro, registra no log (com traceback) e guarda o erro para o cliente
+        logger.exception("Erro ao finalizar a sessao %s", session_id)
+        state = {"status": "error", "detail": str(e)}
+        # Falhou antes da pontuação: devolve a sessão para o jogador poder reenviar o desenho
+        if not scored:
+            game_manager.sessions[session_id] = session
+    # Só grava se o pendente ainda existe: descartado por _purge_session_results, o resultado
+    # voltaria ao fim da fila com um created_at antigo e ficaria preso até chegar ao início
+    if session_id in _session_results:
+        _session_results[session_id] = (created_at, state)
+
+def _purge_session_results():
+    """Descarta os resultados assíncronos que ninguém buscou dentro de SESSION_RESULT_TTL"""
+    expired_before = time.monotonic() - SESSION_RESULT_TTL
+    while _session_results:
+        created_at, _ = next(iter(_session_results.values()))
+        if created_at > expired_before:
+            break
+        _session_results.popitem(last=False)
+
+@app.post("/api/session/complete_async", status_code=202)
+async def complete_session_async(body: CompleteSessionRequest):
+    """
+    Versão assíncrona de /api/session/complete
+    Recebe o mesmo corpo e responde 202 na hora; a análise da IA e a pontuação
+    rodam em segundo plano e o resultado é buscado em /api/session/{session_id}/result
+    """
+    # Corpo já validado pelo FastAPI/Pydantic
+    session_id = body.session_id
+    drawing_data = body.drawing_data  # Imagem em base64
+    time_spent = body.time_spent  # Tempo gasto desenhando
+    
+    # Uma sessão só pode ser enviada uma vez
+    if session_id in _session_results:
+        raise HTTPException(status_code=409, detail="Sessao ja enviada")
+    
+    # Retira a sessão das ativas antes de aceitar o envio (erro vira 404 normal):
+    # um /api/session/complete simultâneo da mesma sessão recebe 404 em vez de pontuá-la também
+    try:
+        session = game_manager.claim_session(session_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Sessao nao encontrada")
+    
+    # Aproveita o envio para descartar resultados abandonados
+    _purge_session_results()
+    
+    # Registra a sessão como pendente e agenda a análise
+    created_at = time.monotonic()
+    _session_results[session_id] = (created_at, {"status": "pending"})
+    task = asyncio.create_task(
+        _complete_in_background(session, drawing_data, time_spent, created_at)
+    )
+    _session_tasks.add(task)
+    task.add_done_callback(_session_tasks.discard)
+    
+    return {"session_id": session_id, "status": "pending", "poll": f"/api/session/{session_id}/result"}
+
+@app.get("/api/session/{session_id}/result")
+async def session_result(session_id: str):
+    """
+    Estado de uma sessão enviada por /api/session/complete_async
+    Retorna {"status": "pending"} enquanto a IA analisa; "done" (com o mesmo
+    resultado de /api/session/complete) ou "error" são entregues uma única vez
+    """
+    entry = _session_results.get(session_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Resultado nao encontrado")
+    
+    state = entry[1]
+    # Resultado final entregue: libera a memória
+    if state["status"] != "pending":
+        del _session_results[session_id]
+    return state
+
 # ===== ROTA DE HEALTH CHECK =====
 
 @app.get("/health")
 async def health():
     """
     Rota de verificação de saúde da API
-    Usada para monitoramento e verificar se o servidor está funcionando
+    Usada para monitoramento e verificar se o servidor está funcionando.
+    Inclui quantas análises aguardam vaga para chamar o Gemini.
     """
-    return {"status": "ok"}
+    return {"status": "ok", "gemini_queue": gemini_service.queue_depth}
+
+# ===== EXECUÇÃO DIRETA =====
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # uvloop e httptools (instalados pelo uvicorn[standard]) dobram a vazão do servidor
+    # Um único worker: jogadores, sessões e ranking vivem na memória deste processo
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -5,7 +5,7 @@ Models: Classes principais do sistema
 
 # Importações necessárias
 from dataclasses import dataclass, field  # Para criar classes de dados simplificadas
-from typing import List, Dict, Optional  # Para tipagem estática
+from typing import List, Dict, Optional, Set  # Para tipagem estática
 from datetime import datetime  # Para trabalhar com datas e horários
 from enum import Enum  # Para criar enumerações
 import random  # Para gerar valores aleatórios
@@ -27,8 +27,16 @@ class BrushType(Enum):
     SPARKLE = "sparkle"  # Brilhante (efeito de partículas)
 
 
+# Bit de cada pincel na máscara de pincéis desbloqueados (na ordem de declaração)
+BRUSH_BITS: Dict[BrushType, int] = {brush: 1 << i for i, brush in enumerate(BrushType)}
+
+
+# XP necessário para passar de cada nível (índice = nível - 1): nível * 100
+_XP_TABLE = tuple(level * 100 for level in range(1, 1000))
+
+
 # Classe que representa um desafio/prompt de desenho
-@dataclass
+@dataclass(slots=True)
 class Prompt:
     """Desafio de desenho"""
     text: str              # Texto do prompt que o jogador deve desenhar
@@ -37,7 +45,7 @@ class Prompt:
     
     
 # Classe que representa um jogador do Inkly
-@dataclass
+@dataclass(slots=True)
 class Player:
     """Jogador do Inkly"""
     id: str                    # Identificador único do jogador
@@ -47,104 +55,105 @@ class Player:
     streak: int = 0            # Sequência de acertos consecutivos
     total_drawings: int = 0    # Total de desenhos feitos
     correct_guesses: int = 0   # Quantidade de desenhos que a IA acertou
-    # Lista de pincéis desbloqueados (começa apenas com o normal)
-    brushes_unlocked: List[BrushType] = field(default_factory=lambda: [BrushType.NORMAL])
-    achievements: List[str] = field(default_factory=list)  # Lista de conquistas desbloqueadas
+    accuracy: float = 0.0      # % de acertos (atualizada a cada desenho finalizado)
+    # Máscara de bits dos pincéis desbloqueados (começa apenas com o normal)
+    brushes_unlocked: int = BRUSH_BITS[BrushType.NORMAL]
+    achievements: Set[str] = field(default_factory=set)  # Conjunto de conquistas desbloqueadas
     last_played: Optional[datetime] = None  # Data/hora da última partida
+    brush_unlock_cursor: int = 0  # Índice do próximo desbloqueio de pincel a verificar
     
     # Método para adicionar XP e verificar se o jogador subiu de nível
     def add_xp(self, points: int) -> bool:
-        """Adiciona XP e verifica level up"""
+        """Adiciona XP e verifica level up (pode subir vários níveis de uma vez)"""
         self.xp += points  # Adiciona os pontos de XP
-        xp_needed = self.level * 100  # Calcula XP necessário para próximo nível (nível * 100)
+        leveled_up = False
         
-        # Se atingiu XP suficiente, sobe de nível
-        if self.xp >= xp_needed:
+        # Sobe de nível enquanto houver XP suficiente (XP necessário vem da tabela pré-calculada)
+        while self.level <= len(_XP_TABLE) and self.xp >= _XP_TABLE[self.level - 1]:
+            self.xp -= _XP_TABLE[self.level - 1]  # Remove o XP usado (mantém o excedente)
             self.level += 1  # Aumenta o nível
-            self.xp -= xp_needed  # Remove o XP usado (mantém o excedente)
-            return True  # Retorna True indicando que subiu de nível
-        return False  # Retorna False se não subiu de nível
+            leveled_up = True
+        return leveled_up  # True se subiu pelo menos um nível
     
     # Método para desbloquear um novo tipo de pincel
     def unlock_brush(self, brush: BrushType):
         """Desbloqueia novo pincel"""
-        # Só adiciona se o pincel ainda não foi desbloqueado
-        if brush not in self.brushes_unlocked:
-            self.brushes_unlocked.append(brush)
+        # Liga o bit do pincel (desbloquear de novo não muda nada)
+        self.brushes_unlocked |= BRUSH_BITS[brush]
+    
+    # Método para verificar se um pincel está desbloqueado
+    def has_brush(self, brush: BrushType) -> bool:
+        """Verifica se o pincel está desbloqueado"""
+        return bool(self.brushes_unlocked & BRUSH_BITS[brush])
     
     # Método para adicionar uma conquista ao jogador
     def add_achievement(self, achievement: str):
         """Adiciona conquista"""
-        # Só adiciona se a conquista ainda não foi obtida
-        if achievement not in self.achievements:
-            self.achievements.append(achievement)
+        # Conjunto ignora conquistas já obtidas
+        self.achievements.add(achievement)
             
 
 # Classe que representa uma sessão de desenho em andamento
-@dataclass
+@dataclass(slots=True)
 class DrawingSession:
     """Sessão de desenho"""
     session_id: str            # ID único da sessão
     player: Player             # Referência ao jogador
     prompt: Prompt             # Prompt/desafio da sessão
     started_at: datetime       # Data/hora de início da sessão
-    drawing_data: Optional[str] = None  # Dados do desenho em Base64 (imagem)
+    drawing_hash: Optional[str] = None  # Hash BLAKE2b do desenho (a imagem não fica em memória)
     ai_guesses: List[str] = field(default_factory=list)  # Lista de palpites feitos pela IA
     correct: bool = False      # Se a IA acertou o desenho
     time_spent: float = 0.0    # Tempo gasto desenhando em segundos
     score: int = 0             # Pontuação obtida nesta sessão
     
 
-# Classe responsável por gerar prompts/desafios de desenho
-class PromptGenerator:
-    """Gerador de prompts inteligentes"""
-    
-    # Lista de prompts fáceis - objetos e conceitos simples do dia-a-dia
-    EASY_PROMPTS = [
+# Prompts de cada dificuldade (tuplas imutáveis) e o tempo limite em segundos para desenhá-los
+_PROMPT_BUCKETS = {
+    # Fáceis - objetos e conceitos simples do dia-a-dia (20 segundos)
+    Difficulty.EASY: ((
         "cachorro", "gato", "casa", "árvore", "sol", "lua", "estrela",
         "coração", "flor", "carro", "bicicleta", "pássaro", "peixe"
-    ]
-    
-    # Lista de prompts médios - criaturas fantásticas e personagens
-    MEDIUM_PROMPTS = [
+    ), 20),
+    # Médios - criaturas fantásticas e personagens (25 segundos)
+    Difficulty.MEDIUM: ((
         "dragão", "robô", "castelo", "foguete", "dinossauro", "sereia",
         "unicórnio", "pirata", "ninja", "bruxa", "vampiro", "zumbi"
-    ]
-    
-    # Lista de prompts difíceis - conceitos abstratos e filosóficos
-    HARD_PROMPTS = [
+    ), 25),
+    # Difíceis - conceitos abstratos e filosóficos (30 segundos)
+    Difficulty.HARD: ((
         "felicidade", "liberdade", "solidão", "caos", "harmonia",
         "tempo", "memória", "sonho", "impossível", "infinito"
-    ]
-    
-    # Lista de prompts surpresa - combinações inusitadas e criativas
-    SURPRISE_PROMPTS = [
-        "um gato astronauta", "pizza voadora", "robô jardineiro",
-        "dragão dormindo", "árvore de doces", "nuvem com pernas",
-        "peixe-guitarra", "cachorro-unicórnio", "casa flutuante"
-    ]
+    ), 30),
+}
+
+# Prompts surpresa - combinações inusitadas e criativas
+_SURPRISE_PROMPTS = (
+    "um gato astronauta", "pizza voadora", "robô jardineiro",
+    "dragão dormindo", "árvore de doces", "nuvem com pernas",
+    "peixe-guitarra", "cachorro-unicórnio", "casa flutuante"
+)
+
+# Gerador próprio: não disputa o estado global do módulo random entre threads
+_RNG = random.Random()
+
+
+# Classe responsável por gerar prompts/desafios de desenho
+class PromptGenerator:
+    """Gerador de prompts inteligentes"""
     
     # Método de classe para gerar um prompt baseado na dificuldade
     @classmethod
     def generate(cls, difficulty: Difficulty, surprise: bool = False) -> Prompt:
         """Gera um prompt baseado na dificuldade"""
         # 30% de chance de gerar um prompt surpresa se a opção estiver ativa
-        if surprise and random.random() > 0.7:
-            text = random.choice(cls.SURPRISE_PROMPTS)  # Escolhe prompt surpresa aleatório
+        if surprise and _RNG.random() > 0.7:
+            text = _RNG.choice(_SURPRISE_PROMPTS)  # Escolhe prompt surpresa aleatório
             return Prompt(text, Difficulty.MEDIUM, time_limit=30)  # Dificuldade média, 30 segundos
         
-        # Gera prompt normal baseado na dificuldade escolhida
-        if difficulty == Difficulty.EASY:
-            text = random.choice(cls.EASY_PROMPTS)  # Escolhe da lista fácil
-            time_limit = 20  # 20 segundos para desenhos fáceis
-        elif difficulty == Difficulty.MEDIUM:
-            text = random.choice(cls.MEDIUM_PROMPTS)  # Escolhe da lista média
-            time_limit = 25  # 25 segundos para desenhos médios
-        else:  # HARD
-            text = random.choice(cls.HARD_PROMPTS)  # Escolhe da lista difícil
-            time_limit = 30  # 30 segundos para desenhos difíceis
-            
-        return Prompt(text, difficulty, time_limit)
+        # Gera prompt normal: lista e tempo limite da dificuldade em uma única busca
+        prompts, time_limit = _PROMPT_BUCKETS[difficulty]
+        return Prompt(_RNG.choice(prompts), difficulty, time_limit)
 
 
 # Sistema de conquistas e achievements do jogo
@@ -185,38 +194,37 @@ class AchievementSystem:
         }
     }
     
+    # Regras de desbloqueio, na ordem em que são avaliadas: (id da conquista, condição)
+    # Cada condição recebe o jogador e a sessão (night_owl ainda não é concedida)
+    RULES = (
+        # Primeiro Traço - completar o primeiro desenho
+        ("first_draw", lambda player, session: player.total_drawings == 1),
+        # Demônio da Velocidade - completar em menos de 5 segundos
+        ("speed_demon", lambda player, session: session.time_spent < 5 and session.correct),
+        # Perfeccionista - acertar 10 desenhos consecutivos
+        ("perfectionist", lambda player, session: player.streak >= 10),
+        # Artista Dedicado - alcançar nível 10
+        ("level_10", lambda player, session: player.level >= 10),
+        # Mestre Abstrato - confundir a IA 5 vezes (total de desenhos - acertos)
+        ("abstract_master", lambda player, session: player.total_drawings - player.correct_guesses >= 5),
+    )
+    
+    # Conquistas avaliadas por check_achievements
+    CHECKED_ACHIEVEMENTS = frozenset(aid for aid, _ in RULES)
+    
     # Método de classe para verificar e desbloquear conquistas
     @classmethod
     def check_achievements(cls, player: Player, session: DrawingSession) -> List[str]:
         """Verifica e retorna conquistas desbloqueadas"""
-        new_achievements = []  # Lista para armazenar novas conquistas desbloqueadas
-        
-        # Conquista: Primeiro Traço - completar o primeiro desenho
-        if player.total_drawings == 1 and "first_draw" not in player.achievements:
-            player.add_achievement("first_draw")
-            new_achievements.append("first_draw")
-        
-        # Conquista: Demônio da Velocidade - completar em menos de 5 segundos
-        if session.time_spent < 5 and session.correct and "speed_demon" not in player.achievements:
-            player.add_achievement("speed_demon")
-            new_achievements.append("speed_demon")
-        
-        # Conquista: Perfeccionista - acertar 10 desenhos consecutivos
-        if player.streak >= 10 and "perfectionist" not in player.achievements:
-            player.add_achievement("perfectionist")
-            new_achievements.append("perfectionist")
+        earned = player.achievements
         
-        # Conquista: Artista Dedicado - alcançar nível 10
-        if player.level >= 10 and "level_10" not in player.achievements:
-            player.add_achievement("level_10")
-            new_achievements.append("level_10")
+        # Jogador já tem todas as conquistas verificadas aqui: nada a fazer
+        if cls.CHECKED_ACHIEVEMENTS <= earned:
+            return []
         
-        # Conquista: Mestre Abstrato - confundir a IA 5 vezes
-        if "abstract_master" not in player.achievements:
-            # Calcula quantas vezes a IA errou (total de desenhos - acertos)
-            confused_count = player.total_drawings - player.correct_guesses
-            if confused_count >= 5:
-                player.add_achievement("abstract_master")
-                new_achievements.append("abstract_master")
+        # Só avalia a condição das conquistas ainda não obtidas (busca O(1) no conjunto)
+        new_achievements = [aid for aid, rule in cls.RULES if aid not in earned and rule(player, session)]
+        for aid in new_achievements:
+            player.add_achievement(aid)
         
         return new_achievements  # Retorna lista de conquistas recém-desbloqueadas
@@ -0,0 +1,66 @@
+"""
+Inkly - Sistema de Desenho com IA
+Schemas: Modelos Pydantic das respostas da API
+"""
+
+# Importações necessárias
+from pydantic import BaseModel  # Modelos com validação e serialização compiladas
+from typing import List, Optional  # Para tipagem estática
+
+
+# Conquista desbloqueada ao finalizar uma sessão
+class AchievementInfo(BaseModel):
+    """Conquista desbloqueada"""
+    id: str           # Identificador da conquista
+    name: str         # Nome exibido ao jogador
+    description: str  # Descrição da conquista
+    xp: int           # XP bônus concedido
+
+
+# Estatísticas do jogador após a sessão
+class PlayerStats(BaseModel):
+    """Estatísticas atualizadas do jogador"""
+    level: int           # Nível atual
+    xp: int              # XP acumulado no nível atual
+    streak: int          # Sequência de acertos
+    total_drawings: int  # Total de desenhos feitos
+
+
+# Resposta de /api/session/complete (e evento final do streaming)
+class SessionCompleteResponse(BaseModel):
+    """Resultado de uma sessão finalizada"""
+    correct: bool                        # Se a IA acertou
+    guesses: List[str]                   # Palpites da IA
+    confidence: int                      # Confiança da IA (0-100%)
+    feedback: Optional[str] = None       # Feedback textual da IA (a IA pode devolver null)
+    reaction: Optional[str] = None       # Reação da IA (emoji/texto)
+    score: int                           # Pontos ganhos
+    xp_gained: int                       # XP ganho
+    achievements: List[AchievementInfo]  # Novas conquistas desbloqueadas
+    level_up: bool                       # Se subiu de nível
+    new_level: Optional[int] = None      # Novo nível (se level_up = true)
+    player_stats: PlayerStats            # Estatísticas atualizadas do jogador
+
+
+# ===== CORPOS DAS REQUISIÇÕES =====
+
+# Corpo de /api/player/create
+class CreatePlayerRequest(BaseModel):
+    """Dados para criar um jogador"""
+    name: str  # Nome do jogador
+
+
+# Corpo de /api/session/start
+class StartSessionRequest(BaseModel):
+    """Dados para iniciar uma sessão"""
+    player_id: str               # ID do jogador
+    difficulty: str = "medium"   # easy|medium|hard (valor desconhecido vira medium)
+    surprise_mode: bool = True   # Modo surpresa ativo por padrão
+
+
+# Corpo de /api/session/complete (e das variantes streaming/assíncrona)
+class CompleteSessionRequest(BaseModel):
+    """Dados do desenho enviado ao finalizar uma sessão"""
+    session_id: str          # ID da sessão
+    drawing_data: str        # Imagem do desenho em base64 (data URL)
+    time_spent: float = 0    # Tempo gasto desenhando, em segundos
@@ -4,16 +4,25 @@ Script para testar a funcionalidade completa de desenho
 Verifica se todos os componentes estão funcionando corretamente
 """
 
+import io
 import json
 import sys
 
+# Saída acumulada em memória enquanto main() roda, escrita de uma vez no final (uma escrita ao invés de ~60)
+# Fora de main() (ex.: funções chamadas pelo pytest) é None e cada linha vai direto para o stdout
+_buffer = None
+
+def _emit(*args):
+    """Escreve uma linha de saída no buffer de main() ou no stdout (mesma formatação do print)"""
+    print(*args, file=_buffer)
+
 def test_game_js_logic():
     """Simula a lógica do game.js para encontrar problemas"""
     
     # Cabeçalho do teste
-    print("=" * 70)
-    print("TESTE DE LÓGICA: game.js")
-    print("=" * 70)
+    _emit("=" * 70)
+    _emit("TESTE DE LÓGICA: game.js")
+    _emit("=" * 70)
     
     # Simular estado inicial
     # Este dicionário representa o estado do jogo no JavaScript
@@ -30,76 +39,76 @@ def test_game_js_logic():
     lastX, lastY = 0, 0   # Última posição do mouse para desenhar linhas contínuas
     
     # Exibir estado inicial
-    print("\n1. ESTADO INICIAL:")
-    print(f"   gameState.isDrawing = {gameState['isDrawing']}")
-    print(f"   isDrawingNow = {isDrawingNow}")
+    _emit("\n1. ESTADO INICIAL:")
+    _emit(f"   gameState.isDrawing = {gameState['isDrawing']}")
+    _emit(f"   isDrawingNow = {isDrawingNow}")
     
     # Simulando click em "Começar"
     # Este é o primeiro passo: o jogador clica no botão "Começar a Desenhar"
-    print("\n2. USUARIO CLICA EM 'COMEÇAR':")
+    _emit("\n2. USUARIO CLICA EM 'COMEÇAR':")
     gameState['isDrawing'] = True  # Habilita o modo de desenho
-    print(f"   gameState.isDrawing = {gameState['isDrawing']} ✓")
+    _emit(f"   gameState.isDrawing = {gameState['isDrawing']} ✓")
     
     # Simulando mousedown no canvas
     # Quando o jogador pressiona o botão do mouse no canvas
-    print("\n3. USUARIO CLICA (MOUSEDOWN) NO CANVAS:")
+    _emit("\n3. USUARIO CLICA (MOUSEDOWN) NO CANVAS:")
     if not gameState['isDrawing']:
         # Se o jogo não está no modo desenho, ignora o evento
-        print("   ❌ ERRO: gameState.isDrawing = False, event ignorado")
+        _emit("   ❌ ERRO: gameState.isDrawing = False, event ignorado")
     else:
         # Ativa o modo de desenho contínuo
         isDrawingNow = True
         gameState['hasDrawn'] = True  # Marca que o jogador já desenhou algo
         lastX, lastY = 100, 100       # Define a posição inicial do desenho
-        print(f"   ✓ isDrawingNow = {isDrawingNow}")
-        print(f"   ✓ gameState.hasDrawn = {gameState['hasDrawn']}")
-        print(f"   ✓ lastX, lastY = {lastX}, {lastY}")
+        _emit(f"   ✓ isDrawingNow = {isDrawingNow}")
+        _emit(f"   ✓ gameState.hasDrawn = {gameState['hasDrawn']}")
+        _emit(f"   ✓ lastX, lastY = {lastX}, {lastY}")
     
     # Simulando mousemove no canvas
     # Quando o jogador move o mouse enquanto mantém o botão pressionado
-    print("\n4. USUARIO MOVE O MOUSE (MOUSEMOVE) NO CANVAS:")
+    _emit("\n4. USUARIO MOVE O MOUSE (MOUSEMOVE) NO CANVAS:")
     x, y = 150, 150  # Nova posição do mouse
     if not isDrawingNow or not gameState['isDrawing']:
         # Se não está desenhando agora OU o modo desenho não está ativo, ignora
-        print("   ❌ ERRO: drawMouse ignorado")
-        if not isDrawingNow: print("      - isDrawingNow = False")
-        if not gameState['isDrawing']: print("      - gameState.isDrawing = False")
+        _emit("   ❌ ERRO: drawMouse ignorado")
+        if not isDrawingNow: _emit("      - isDrawingNow = False")
+        if not gameState['isDrawing']: _emit("      - gameState.isDrawing = False")
     else:
         # Desenha uma linha da última posição até a nova posição
-        print(f"   ✓ draw({x}, {y}) será chamado")
+        _emit(f"   ✓ draw({x}, {y}) será chamado")
         lastX, lastY = x, y  # Atualiza a última posição para a próxima linha
-        print(f"   ✓ lastX, lastY atualizado para {lastX}, {lastY}")
+        _emit(f"   ✓ lastX, lastY atualizado para {lastX}, {lastY}")
     
     # Verificar lógica do draw()
     # Esta função mostra o que acontece dentro da função draw() do JavaScript
-    print("\n5. LÓGICA DE draw(x, y):")
-    print(f"   - Cor: {gameState['currentColor']}")
-    print(f"   - Pincel: {gameState['currentBrush']}")
-    print(f"   - Tamanho: {gameState['brushSize']}")
-    print(f"   - Desenhar linha de ({lastX}, {lastY}) para ({x}, {y})")
+    _emit("\n5. LÓGICA DE draw(x, y):")
+    _emit(f"   - Cor: {gameState['currentColor']}")
+    _emit(f"   - Pincel: {gameState['currentBrush']}")
+    _emit(f"   - Tamanho: {gameState['brushSize']}")
+    _emit(f"   - Desenhar linha de ({lastX}, {lastY}) para ({x}, {y})")
     # Comandos do Canvas API do HTML5
-    print(f"   ✓ ctx.beginPath()")      # Inicia um novo caminho de desenho
-    print(f"   ✓ ctx.moveTo({lastX}, {lastY})")  # Move para a posição inicial
-    print(f"   ✓ ctx.lineTo({x}, {y})")  # Cria uma linha até a nova posição
-    print(f"   ✓ ctx.stroke()")           # Desenha a linha no canvas
+    _emit(f"   ✓ ctx.beginPath()")      # Inicia um novo caminho de desenho
+    _emit(f"   ✓ ctx.moveTo({lastX}, {lastY})")  # Move para a posição inicial
+    _emit(f"   ✓ ctx.lineTo({x}, {y})")  # Cria uma linha até a nova posição
+    _emit(f"   ✓ ctx.stroke()")           # Desenha a linha no canvas
     
     # Simulando mouseup
     # Quando o jogador solta o botão do mouse
-    print("\n6. USUARIO SOLTA O BOTÃO (MOUSEUP):")
+    _emit("\n6. USUARIO SOLTA O BOTÃO (MOUSEUP):")
     isDrawingNow = False  # Desativa o modo de desenho contínuo
-    print(f"   ✓ isDrawingNow = {isDrawingNow}")
+    _emit(f"   ✓ isDrawingNow = {isDrawingNow}")
     
     # Resumo do teste
-    print("\n" + "=" * 70)
-    print("TESTE DE LÓGICA: PASSOU ✓")
-    print("=" * 70)
+    _emit("\n" + "=" * 70)
+    _emit("TESTE DE LÓGICA: PASSOU ✓")
+    _emit("=" * 70)
 
 def test_event_flow():
     """Testa o fluxo completo de eventos"""
     
-    print("\n" + "=" * 70)
-    print("FLUXO DE EVENTOS ESPERADO")
-    print("=" * 70)
+    _emit("\n" + "=" * 70)
+    _emit("FLUXO DE EVENTOS ESPERADO")
+    _emit("=" * 70)
     
     # Lista de eventos na ordem correta que devem ocorrer no jogo
     events = [
@@ -114,17 +123,17 @@ def test_event_flow():
     
     # Exibe cada evento numerado com sua ação correspondente
     for i, (event, action) in enumerate(events, 1):
-        print(f"{i}. [{event}]")
-        print(f"   → {action}")
+        _emit(f"{i}. [{event}]")
+        _emit(f"   → {action}")
     
-    print("\n" + "=" * 70)
+    _emit("\n" + "=" * 70)
 
 def check_canvas_properties():
     """Verifica as propriedades do canvas"""
     
-    print("\n" + "=" * 70)
-    print("PROPRIEDADES DO CANVAS (HTML)")
-    print("=" * 70)
+    _emit("\n" + "=" * 70)
+    _emit("PROPRIEDADES DO CANVAS (HTML)")
+    _emit("=" * 70)
     
     # Propriedades esperadas do elemento canvas no HTML
     properties = {
@@ -138,41 +147,48 @@ def check_canvas_properties():
     
     # Exibe cada propriedade com marcação de verificado
     for key, val in properties.items():
-        print(f"✓ {key}: {val}")
+        _emit(f"✓ {key}: {val}")
     
-    print("\n" + "=" * 70)
+    _emit("\n" + "=" * 70)
 
 def main():
     """Função principal que executa todos os testes"""
     
-    # Cabeçalho principal do script de debug
-    print("\n")
-    print("╔" + "=" * 68 + "╗")
-    print("║ INKLY DEBUG: TESTE DE FUNCIONALIDADE DE DESENHO                      ║")
-    print("╚" + "=" * 68 + "╝")
-    
-    # Executa todos os testes em sequência
-    test_game_js_logic()     # Testa a lógica do JavaScript
-    test_event_flow()        # Testa o fluxo de eventos
-    check_canvas_properties() # Verifica propriedades do canvas
-    
-    # Resumo final de todos os testes
-    print("\n" + "=" * 70)
-    print("RESUMO DOS TESTES:")
-    print("=" * 70)
-    print("✓ Lógica de gameState: OK")
-    print("✓ Fluxo de eventos: OK")
-    print("✓ Propriedades do canvas: OK")
-    
-    # Instruções para o próximo passo: teste manual no navegador
-    print("\nPróximo passo: Testar em navegador com console aberto")
-    print("1. Abra http://localhost:8000/game?player_id=test123")
-    print("2. Abra Developer Tools (F12)")
-    print("3. Vá para aba 'Console'")
-    print("4. Clique em 'Começar'")
-    print("5. Tente desenhar no canvas")
-    print("6. Verifique se há logs [INKLY] no console")
-    print("=" * 70)
+    global _buffer
+    _buffer = io.StringIO()
+    try:
+        # Cabeçalho principal do script de debug
+        _emit("\n")
+        _emit("╔" + "=" * 68 + "╗")
+        _emit("║ INKLY DEBUG: TESTE DE FUNCIONALIDADE DE DESENHO                      ║")
+        _emit("╚" + "=" * 68 + "╝")
+        
+        # Executa todos os testes em sequência
+        test_game_js_logic()     # Testa a lógica do JavaScript
+        test_event_flow()        # Testa o fluxo de eventos
+        check_canvas_properties() # Verifica propriedades do canvas
+        
+        # Resumo final de todos os testes
+        _emit("\n" + "=" * 70)
+        _emit("RESUMO DOS TESTES:")
+        _emit("=" * 70)
+        _emit("✓ Lógica de gameState: OK")
+        _emit("✓ Fluxo de eventos: OK")
+        _emit("✓ Propriedades do canvas: OK")
+        
+        # Instruções para o próximo passo: teste manual no navegador
+        _emit("\nPróximo passo: Testar em navegador com console aberto")
+        _emit("1. Abra http://localhost:8000/game?player_id=test123")
+        _emit("2. Abra Developer Tools (F12)")
+        _emit("3. Vá para aba 'Console'")
+        _emit("4. Clique em 'Começar'")
+        _emit("5. Tente desenhar no canvas")
+        _emit("6. Verifique se há logs [INKLY] no console")
+        _emit("=" * 70)
+    finally:
+        # Escreve toda a saída acumulada de uma só vez (mesmo se um teste falhar) e descarta o buffer
+        sys.stdout.write(_buffer.getvalue())
+        _buffer = None
 
 # Ponto de entrada do script
 # Executa a função main() apenas se o script for executado diretamente
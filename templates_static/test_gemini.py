@@ -1,15 +1,118 @@
 # Importações necessárias para o script de teste
+import asyncio  # Para disparar vários prompts em paralelo
 import os  # Para acessar variáveis de ambiente
-import requests  # Para fazer requisições HTTP à API do Gemini
-import json  # Para serializar/desserializar dados JSON
+import httpx  # Cliente HTTP assíncrono para fazer requisições à API do Gemini
+import orjson  # Para serializar/desserializar JSON (mais rápido que o json padrão)
 from dotenv import load_dotenv  # Para carregar variáveis do arquivo .env
+from typing import Any, List, Optional  # Para type hints
 
 # 1. Carrega as variáveis do .env
 # O arquivo .env deve conter a chave GEMINI_API_KEY
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")  # Recupera a chave da API do Gemini
+# Só lê o arquivo do disco se a chave ainda não estiver no ambiente (e nunca sobrescreve)
+if "GEMINI_API_KEY" not in os.environ:
+    load_dotenv(override=False)
+# Recupera a chave da API do Gemini uma única vez (string vazia conta como ausente)
+# Sem chave o módulo continua importável: o teste apenas relata o erro
+API_KEY = os.environ.get("GEMINI_API_KEY") or None
 
-def test_gemini_connection():
+# Prompt simples usado quando nenhum outro é informado
+DEFAULT_PROMPT = "Olá! Responda com apenas uma frase: O sistema está funcionando?"
+
+# 2. Configuração da URL (Usando o modelo gemini-2.5-flash), montada uma única vez
+# Se quiser usar o pro, mude para 'gemini-pro'
+# A URL inclui o modelo a ser usado e a chave API como parâmetro de query
+_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={API_KEY}"
+
+def _build_body(prompt: str) -> bytes:
+    """
+    Monta e serializa o corpo da requisição para um prompt.
+    
+    Args:
+        prompt: Texto enviado à IA
+        
+    Returns:
+        Corpo JSON já serializado (bytes)
+    """
+    # O Corpo da requisição (Payload) DEVE seguir esta estrutura exata
+    # A estrutura é específica da API do Gemini e não pode ser alterada
+    return orjson.dumps({
+        "contents": [{  # Array de conteúdos a serem processados
+            "parts": [{  # Array de partes do conteúdo
+                "text": prompt
+            }]
+        }]
+    })
+
+def _extract_text(result: Any) -> Optional[str]:
+    """
+    Extrai o texto da resposta da API pelo caminho fixo candidates[0].content.parts[0].text.
+    
+    Args:
+        result: Resposta JSON já convertida com orjson
+        
+    Returns:
+        Texto da resposta ou None se o formato for diferente do esperado
+    """
+    # Acesso direto ao caminho; qualquer desvio do formato cai em um único except
+    try:
+        return result["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+# Status transitórios que valem nova tentativa (limite de taxa e erros do servidor)
+_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+# Número máximo de novas tentativas e fator do backoff exponencial (0.3s, 0.6s, 1.2s)
+_RETRY_TOTAL = 3
+_BACKOFF_FACTOR = 0.3
+
+async def _post(client: httpx.AsyncClient, body: bytes) -> httpx.Response:
+    """
+    Envia o corpo à API, repetindo com backoff exponencial em falhas transitórias.
+    
+    Args:
+        client: Cliente HTTP aberto pelo chamador (ver _new_client)
+        body: Corpo JSON já serializado
+        
+    Returns:
+        Última resposta recebida (pode ainda ser um erro após esgotar as tentativas)
+        
+    Raises:
+        httpx.HTTPError: Se a última tentativa falhar por rede/timeout
+    """
+    for attempt in range(_RETRY_TOTAL + 1):
+        try:
+            response = await client.post(_URL, content=body)
+        except httpx.TransportError:
+            # Erro de rede/timeout: repete, a menos que seja a última tentativa
+            if attempt == _RETRY_TOTAL:
+                raise
+        else:
+            if response.status_code not in _RETRY_STATUS or attempt == _RETRY_TOTAL:
+                return response
+        # Espera antes da próxima tentativa (o dobro a cada vez)
+        await asyncio.sleep(_BACKOFF_FACTOR * (2 ** attempt))
+
+# Corpo do prompt padrão serializado na importação (o teste normal não serializa nada)
+_DEFAULT_BODY = _build_body(DEFAULT_PROMPT)
+
+def _new_client() -> httpx.AsyncClient:
+    """
+    Cria o cliente HTTP de uma execução, para uso com `async with` (fechado ao sair do bloco).
+    
+    Dentro da execução o cliente mantém a conexão TLS aberta (keep-alive) e, com HTTP/2,
+    multiplexa vários prompts simultâneos na mesma conexão. Criado já dentro do event loop
+    em uso, nunca preso a um loop anterior.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+        # Cabeçalho fixo definido uma única vez (indica que estamos enviando JSON)
+        headers={"Content-Type": "application/json"},
+        # Timeout de leitura 30s, conexão 3.05s
+        timeout=httpx.Timeout(30.0, connect=3.05),
+    )
+
+async def check_gemini_connection(client: httpx.AsyncClient, prompt: str = DEFAULT_PROMPT) -> bool:
     """
     Função de teste para verificar a conexão com a API do Google Gemini.
     
@@ -18,67 +121,52 @@ def test_gemini_connection():
     - Faz uma requisição simples à API do Gemini
     - Valida a resposta recebida
     - Retorna True se tudo funcionar corretamente
+    
+    Args:
+        client: Cliente HTTP aberto pelo chamador (ver _new_client)
+        prompt: Texto enviado à IA (padrão: DEFAULT_PROMPT)
     """
     print("🔍 Testando conexão com Google Gemini API...")
 
-    # Verifica se a chave API foi carregada do arquivo .env
-    if not API_KEY:
+    # Verifica se a chave API foi carregada (validada uma vez na importação)
+    if API_KEY is None:
         print("❌ ERRO: GEMINI_API_KEY não encontrada no arquivo .env!")
         return False
 
     # Exibe os primeiros e últimos caracteres da chave para confirmação (sem expor a chave completa)
     print(f"✅ API Key encontrada: {API_KEY[:5]}...{API_KEY[-4:]}")
 
-    # 2. Configuração da URL (Usando o modelo gemini-1.5-flash)
-    # Se quiser usar o pro, mude para 'gemini-pro'
-    # Nota: O modelo gemini-2.5-flash é mais recente e pode oferecer melhor desempenho
-    # 3. Cabeçalhos
-    # A URL inclui o modelo a ser usado e a chave API como parâmetro de query
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={API_KEY}"
-    
-    # Headers HTTP necessários para a requisição
-    headers = {
-        "Content-Type": "application/json"  # Indica que estamos enviando JSON
-    }
-
-    # 4. O Corpo da requisição (Payload) DEVE seguir esta estrutura exata
-    # A estrutura é específica da API do Gemini e não pode ser alterada
-    payload = {
-        "contents": [{  # Array de conteúdos a serem processados
-            "parts": [{  # Array de partes do conteúdo
-                "text": "Olá! Responda com apenas uma frase: O sistema está funcionando?"
-                # Prompt simples para testar se a API responde corretamente
-            }]
-        }]
-    }
+    # URL e cabeçalhos já prontos (módulo e cliente); só prompts novos são serializados
+    body = _DEFAULT_BODY if prompt == DEFAULT_PROMPT else _build_body(prompt)
 
     try:
         print("🌐 Enviando requisição...")
         # Faz a requisição POST para a API do Gemini
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        # O corpo já está em bytes, enviado direto sem nova codificação
+        # O cliente reaproveita a conexão já aberta; o await libera o loop para outros prompts
+        # Falhas transitórias (429/5xx, rede) são repetidas com backoff
+        response = await _post(client, body)
         
         # Verifica se deu erro (400, 401, 500, etc)
         # Status 200 indica sucesso
         if response.status_code == 200:
-            print("✅ Conexão bem-sucedida! (Status 200)")
+            # Mostra também o protocolo negociado (HTTP/2 quando o Google aceita multiplexar)
+            print(f"✅ Conexão bem-sucedida! (Status 200, {response.http_version})")
             
-            # Converte a resposta JSON em dicionário Python
-            result = response.json()
+            # Converte a resposta JSON em dicionário Python (direto dos bytes recebidos)
+            result = orjson.loads(response.content)
             
-            # Navegação segura pelo JSON para pegar a resposta
-            # A estrutura da resposta é: candidates[0].content.parts[0].text
-            try:
-                # Extrai o texto da resposta seguindo a estrutura específica da API
-                text = result['candidates'][0]['content']['parts'][0]['text']
-                print(f"🤖 Resposta da IA: '{text.strip()}'")  # Remove espaços em branco extras
-                print("\n🚀 Tudo pronto! Sua integração está funcionando.")
-                return True  # Teste passou com sucesso
-                
-            except (KeyError, IndexError):
+            # Extrai o texto da resposta seguindo a estrutura específica da API
+            text = _extract_text(result)
+            if text is None:
                 # Se a estrutura JSON for diferente do esperado
                 print("⚠️ Resposta recebida, mas formato inesperado:")
                 print(result)  # Exibe a resposta completa para debug
                 return False  # Teste falhou
+            
+            print(f"🤖 Resposta da IA: '{text.strip()}'")  # Remove espaços em branco extras
+            print("\n🚀 Tudo pronto! Sua integração está funcionando.")
+            return True  # Teste passou com sucesso
                 
         else:
             # Se o status não for 200 (erro na requisição)
@@ -91,6 +179,79 @@ def test_gemini_connection():
         print(f"❌ ERRO de Execução: {e}")
         return False
 
+async def run_many(prompts: List[str]) -> List[bool]:
+    """
+    Envia vários prompts ao mesmo tempo, compartilhando o mesmo cliente HTTP.
+    
+    Args:
+        prompts: Textos a enviar
+        
+    Returns:
+        Lista com o resultado de cada teste, na ordem dos prompts
+    """
+    # Um cliente para a execução inteira: os prompts simultâneos dividem a mesma conexão
+    async with _new_client() as client:
+        return await asyncio.gather(*[check_gemini_connection(client, p) for p in prompts])
+
+async def send_batch(prompts: List[str]) -> List[Optional[str]]:
+    """
+    Envia vários prompts em uma única requisição generateContent.
+    
+    A API trata `contents` como uma conversa (e não como pedidos independentes),
+    então os prompts vão numerados no mesmo texto e a IA devolve um array JSON
+    com uma resposta por prompt, na mesma ordem.
+    
+    Args:
+        prompts: Textos a enviar
+        
+    Returns:
+        Lista com a resposta de cada prompt (None se faltou ou se a chamada falhou)
+    """
+    if not prompts or API_KEY is None:
+        return [None] * len(prompts)
+    
+    # Lista numerada dos prompts, pedindo um array JSON de strings como resposta
+    numbered = "\n".join(f"{i + 1}. {prompt}" for i, prompt in enumerate(prompts))
+    text = (
+        f"Responda a cada um dos {len(prompts)} pedidos abaixo. Retorne apenas um array JSON "
+        f"com exatamente {len(prompts)} strings, uma resposta por pedido, na mesma ordem.\n"
+        f"{numbered}"
+    )
+    body = orjson.dumps({
+        "contents": [{"parts": [{"text": text}]}],
+        "generationConfig": {"responseMimeType": "application/json"},
+    })
+    
+    try:
+        # Uma única ida e volta para todos os prompts
+        async with _new_client() as client:
+            response = await _post(client, body)
+        if response.status_code != 200:
+            print(f"❌ ERRO: Status {response.status_code}")
+            return [None] * len(prompts)
+        answers = orjson.loads(_extract_text(orjson.loads(response.content)) or "null")
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+        print(f"❌ ERRO no lote: {e}")
+        return [None] * len(prompts)
+    
+    # Alinha as respostas aos prompts (a IA pode devolver menos itens que o pedido)
+    if not isinstance(answers, list):
+        return [None] * len(prompts)
+    return [str(answer) if answer is not None else None for answer in answers[:len(prompts)]] + [None] * (len(prompts) - len(answers))
+
+async def _main() -> bool:
+    """Executa o teste de conexão com um cliente HTTP próprio, fechado ao final"""
+    async with _new_client() as client:
+        return await check_gemini_connection(client)
+
+def test_gemini_connection() -> bool:
+    """
+    Ponto de entrada síncrono do teste de conexão (coletado pelo pytest e usado pelo script).
+    
+    Roda `check_gemini_connection` em um event loop próprio e fecha o cliente HTTP ao final.
+    """
+    return asyncio.run(_main())
+
 # Ponto de entrada do script
 # Este bloco só executa se o arquivo for rodado diretamente (não importado)
 if __name__ == "__main__":